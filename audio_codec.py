@@ -0,0 +1,122 @@
+'''
+File: audio_codec.py
+Created Date: Monday, October 19th 2026, 4:12:30 pm
+
+Project Ver 2024
+'''
+
+### Response audio codecs. The client lists what it can decode in the Accept header, the server
+### answers in one of them and says which in Content-Type; anything else is taken as raw PCM,
+### which is what the backend has always sent.
+### Opus travels as raw packets, each prefixed with its length as a big-endian uint16.
+
+import struct
+
+import numpy as np
+
+try:
+    import opuslib
+except Exception:       # opuslib not installed (ImportError), or installed without libopus (plain Exception): PCM only
+    opuslib = None
+
+
+PCM_TYPE = 'audio/L16'
+OPUS_TYPE = 'audio/opus'
+CODEC_TYPES = {"opus": OPUS_TYPE, "pcm": PCM_TYPE}
+
+FRAME_HEADER = struct.Struct('>H')
+
+
+NOT_AUDIO_SUFFIXES = ('json', 'xml', 'html')
+
+
+def is_audio_type(content_type):
+    # Whether an answer body is audio. decoder_for() plays anything that is not Opus as raw PCM, unlabelled
+    # included (the backend has always sent it that way), so only types that are clearly something
+    # else are refused: text/* and JSON / XML / HTML error bodies
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    return not media_type.startswith('text/') and not media_type.endswith(NOT_AUDIO_SUFFIXES)
+
+
+def available_codecs(preference=("opus", "pcm")):
+    return [codec for codec in preference if codec in CODEC_TYPES and (codec != "opus" or opuslib is not None)]
+
+
+def accept_header(codecs):
+    return ', '.join(CODEC_TYPES[codec] for codec in codecs)
+
+
+def choose_codec(accept, supported=("opus", "pcm")):
+    # Server side: first type in the client's Accept list that this end can encode
+    for media_type in (accept or '').split(','):
+        media_type = media_type.split(';')[0].strip()
+        for codec in supported:
+            if CODEC_TYPES.get(codec) == media_type and (codec != "opus" or opuslib is not None):
+                return codec
+    return "pcm"
+
+
+class PcmDecoder:
+    # Raw int16 PCM. Reads end wherever the socket did, a split sample is kept for the next chunk.
+    # passthrough: the device path skips decode() and hands the bytes to the jitter buffer as they are
+    passthrough = True
+
+    def __init__(self, samplerate=24000, channels=1):
+        self.carry = b''
+
+    def decode(self, data):
+        if not self.carry and not len(data) & 1:
+            return np.frombuffer(data, dtype=np.int16)     # the common case, no copy
+        data = self.carry + data
+        usable = len(data) & ~1
+        self.carry = data[usable:]
+        return np.frombuffer(data, dtype=np.int16, count=usable // 2)
+
+
+class OpusDecoder:
+    # Length-prefixed Opus packets, decoded as soon as each one is complete
+    passthrough = False
+
+    def __init__(self, samplerate=24000, channels=1):
+        self.decoder = opuslib.Decoder(samplerate, channels)
+        self.max_frame = samplerate * 120 // 1000   # longest Opus frame
+        self.buffer = bytearray()
+
+    def decode(self, data):
+        self.buffer += data
+        pcm = []
+        offset = 0
+        while len(self.buffer) - offset >= FRAME_HEADER.size:
+            (length,) = FRAME_HEADER.unpack_from(self.buffer, offset)
+            end = offset + FRAME_HEADER.size + length
+            if end > len(self.buffer):
+                break
+            pcm.append(self.decoder.decode(bytes(self.buffer[offset + FRAME_HEADER.size:end]), self.max_frame))
+            offset = end
+        del self.buffer[:offset]
+        return np.frombuffer(b''.join(pcm), dtype=np.int16)
+
+
+class OpusEncoder:
+    # Server side counterpart, for the reference server and benchmarks
+    def __init__(self, samplerate=24000, channels=1, bitrate=24000, frame_ms=20):
+        self.encoder = opuslib.Encoder(samplerate, channels, opuslib.APPLICATION_VOIP)
+        self.encoder.bitrate = bitrate
+        self.frame = samplerate * frame_ms // 1000
+
+    def encode(self, samples):
+        # int16 samples, a whole number of frames (the tail is zero padded), to framed packets
+        padded = np.zeros(-(-len(samples) // self.frame) * self.frame, dtype=np.int16)
+        padded[:len(samples)] = samples
+        out = bytearray()
+        for start in range(0, len(padded), self.frame):
+            packet = self.encoder.encode(padded[start:start + self.frame].tobytes(), self.frame)
+            out += FRAME_HEADER.pack(len(packet)) + packet
+        return bytes(out)
+
+
+def decoder_for(content_type, samplerate=24000, channels=1):
+    media_type = (content_type or '').split(';')[0].strip()
+    if media_type == OPUS_TYPE and opuslib is not None:
+        return OpusDecoder(samplerate, channels)
+    return PcmDecoder(samplerate, channels)
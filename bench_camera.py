@@ -0,0 +1,56 @@
+'''
+File: bench_camera.py
+Created Date: Sunday, October 18th 2026, 7:31:09 pm
+
+Project Ver 2024
+'''
+
+### Off-device comparison of the capture_array() loop against request-based capture into the ring,
+### using the fake camera backend. Reports stored fps, CPU and bytes allocated per frame.
+
+import argparse
+import time
+import tracemalloc
+
+from camera import CameraController
+
+
+def run(capture_path, seconds, fps):
+    camera = CameraController(backend="fake", capture_path=capture_path,
+                              active_fps=fps, idle_fps=fps)
+    camera.set_state("CASEA")   # keep the active rate for the whole run
+    time.sleep(1)   # let the ring fill and allocate its slots
+
+    allocated_before = camera.picam2.allocated_bytes
+    frames_before = camera.ring.next_seq
+    tracemalloc.start()
+    cpu_start = time.process_time()
+    wall_start = time.monotonic()
+    time.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    wall = time.monotonic() - wall_start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    frames = camera.ring.next_seq - frames_before
+    allocated = camera.picam2.allocated_bytes - allocated_before
+    camera.stop()
+
+    frames = max(frames, 1)
+    return {
+        "fps": frames / wall,
+        "cpu_pct": 100 * cpu / wall,
+        "cpu_ms_per_frame": 1000 * cpu / frames,
+        "alloc_mb_per_frame": allocated / frames / 1e6,
+        "peak_traced_mb": peak / 1e6,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--fps", type=int, default=15)
+    args = parser.parse_args()
+
+    for path in ("array", "request"):
+        result = run(path, args.seconds, args.fps)
+        print(f"{path:8s} " + "  ".join(f"{k}={v:.2f}" for k, v in result.items()))
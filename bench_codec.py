@@ -0,0 +1,76 @@
+'''
+File: bench_codec.py
+Created Date: Monday, October 19th 2026, 4:48:05 pm
+
+Project Ver 2024
+'''
+
+### Bytes on the wire, decode CPU and time to first audio for the answer stream, PCM against Opus,
+### through ref_server.py with a throttled downlink. Decoding is done with the same decoders the
+### device uses; the output device is left out so only the transport and codec are measured.
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from audio_codec import accept_header, available_codecs, decoder_for
+from network import multipart_body
+from ref_server import SAMPLERATE, ReferenceServer, start
+
+
+async def fetch(session, url, codec):
+    body, headers = multipart_body([('text', 'describe'), ('file', ('image.jpg', b'\xff' * 1000, 'image/jpeg'))])
+    headers['Accept'] = accept_header([codec])
+    sent = time.monotonic()
+    received = 0
+    samples = 0
+    decode_cpu = 0
+    first_audio = None
+    async with session.get(url, data=body, headers=headers) as response:
+        decoder = decoder_for(response.headers.get('Content-Type'), SAMPLERATE)
+        async for chunk in response.content.iter_any():
+            received += len(chunk)
+            start = time.process_time()
+            pcm = decoder.decode(chunk)
+            decode_cpu += time.process_time() - start
+            if len(pcm) and first_audio is None:
+                first_audio = time.monotonic() - sent
+            samples += len(pcm)
+    return {
+        "codec": type(decoder).__name__,
+        "kbytes": received / 1000,
+        "kbps": received * 8 / 1000 / (samples / SAMPLERATE),
+        "decode_ms_per_s": 1000 * decode_cpu / (samples / SAMPLERATE),
+        "first_audio_ms": 1000 * first_audio,
+    }
+
+
+async def main(args):
+    server = ReferenceServer(think_ms=args.think_ms, answer_seconds=args.answer_seconds, pace=args.pace,
+                             downlink_kbps=args.downlink_kbps, opus_bitrate=args.bitrate, answer_pcm=args.answer_pcm)
+    runner = await start(server, port=args.port)
+    url = f'http://127.0.0.1:{args.port}'
+    codecs = available_codecs()
+    if "opus" not in codecs:
+        print("opuslib / libopus not available, measuring PCM only")
+
+    async with aiohttp.ClientSession() as session:
+        for codec in codecs:
+            result = await fetch(session, url, codec)
+            print(f"{codec:5s} " + "  ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}"
+                                             for k, v in result.items()))
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--downlink-kbps", type=int, default=256, help="0 for unthrottled")
+    parser.add_argument("--bitrate", type=int, default=24000, help="Opus bitrate, bits/s")
+    parser.add_argument("--answer-seconds", type=float, default=6.0)
+    parser.add_argument("--answer-pcm", help="raw 24 kHz mono int16 file to answer with")
+    parser.add_argument("--think-ms", type=int, default=300)
+    parser.add_argument("--pace", type=float, default=4.0, help="server send rate, x real time")
+    asyncio.run(main(parser.parse_args()))
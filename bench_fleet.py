@@ -0,0 +1,84 @@
+'''
+File: bench_fleet.py
+Created Date: Tuesday, October 20th 2026, 3:10:26 pm
+
+Project Ver 2024
+'''
+
+### Several devices sharing one backend, some of them cancelling their answer part way through.
+### Run once with the old bare POST /cancel and once with the cancel naming device and request id,
+### through ref_server.py. Reports how many answers of devices that did not cancel were cut short,
+### how much server work the cancels gave back, and what was still running right after them.
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import aiohttp
+import numpy as np
+
+from network import multipart_body, request_headers
+from ref_server import ReferenceServer, start
+
+
+async def device(session, url, index, args, targeted, expected, after_cancel):
+    # One interaction. Returns (cancelled, complete)
+    device_id = f"device-{index}"
+    request_id = uuid.uuid4().hex
+    cancels = index < args.devices * args.cancel_fraction
+    body, headers = multipart_body([('text', 'describe'), ('file', ('image.jpg', b'\xff' * 1000, 'image/jpeg'))])
+    headers.update(request_headers(device_id, request_id))
+    received = 0
+    await asyncio.sleep(index * args.stagger_ms / 1000)
+    async with session.get(url, data=body, headers=headers) as response:
+        started = time.monotonic()
+        async for chunk in response.content.iter_any():
+            received += len(chunk)
+            if cancels and time.monotonic() - started > args.cancel_after_ms / 1000:
+                ids = request_headers(device_id, request_id) if targeted else None
+                async with session.post(url + '/cancel', headers=ids):
+                    pass
+                async with session.get(url + '/stats') as stats:
+                    after_cancel.append((await stats.json())["streams"])
+                response.close()
+                break
+    return cancels, received >= expected
+
+
+async def run(args, targeted):
+    server = ReferenceServer(think_ms=args.think_ms, answer_seconds=args.answer_seconds, pace=args.pace)
+    runner = await start(server, port=args.port)
+    url = f'http://127.0.0.1:{args.port}'
+    expected = sum(len(chunk) for chunk in server.chunks["pcm"])
+    after_cancel = []
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0),
+                                     headers={'Accept': 'audio/L16'}) as session:
+        results = await asyncio.gather(*(device(session, url, i, args, targeted, expected, after_cancel)
+                                         for i in range(args.devices)))
+    await runner.cleanup()
+
+    listeners = [complete for cancels, complete in results if not cancels]
+    stats = server.stats
+    print(f"{'targeted' if targeted else 'bare':8s} cancels {sum(c for c, _ in results)}, "
+          f"other devices cut short {listeners.count(False)}/{len(listeners)}, "
+          f"server work {stats['work_done_s']:.1f} s, released {stats['work_released_s']:.1f} s, "
+          f"streams right after a cancel: median {np.median(after_cancel or [0]):.0f}")
+
+
+async def main(args):
+    for targeted in (False, True):
+        await run(args, targeted)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--cancel-fraction", type=float, default=0.25)
+    parser.add_argument("--cancel-after-ms", type=int, default=500)
+    parser.add_argument("--stagger-ms", type=int, default=50, help="delay between device starts")
+    parser.add_argument("--think-ms", type=int, default=300)
+    parser.add_argument("--answer-seconds", type=float, default=4.0)
+    parser.add_argument("--pace", type=float, default=2.0, help="server send rate, x real time")
+    asyncio.run(main(parser.parse_args()))
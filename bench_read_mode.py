@@ -0,0 +1,54 @@
+'''
+File: bench_read_mode.py
+Created Date: Monday, October 19th 2026, 10:26:44 am
+
+Project Ver 2024
+'''
+
+### Bytes saved and on-device CPU cost of the read-mode text crop, on synthetic signs at a few
+### skews or on image files given on the command line (already rotated, BGR as cv2.imread gives).
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from image_pipeline import ImageEncoder, TextRegionCropper
+
+
+def synthetic_sign(skew, size=(1600, 1300), seed=0):
+    rng = np.random.default_rng(seed)
+    width, height = size
+    scene = cv2.resize(rng.integers(60, 200, (40, 50, 3), dtype=np.uint8), size, interpolation=cv2.INTER_CUBIC)
+    cv2.rectangle(scene, (500, 400), (1200, 800), (235, 235, 235), -1)
+    for i, line in enumerate(["EXIT ONLY", "Platform 3 - Trains to", "the city every 10 min", "Mind the gap"]):
+        cv2.putText(scene, line, (520, 470 + i * 90), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (20, 20, 20), 3)
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), skew, 1.0)
+    return cv2.warpAffine(scene, matrix, size, borderMode=cv2.BORDER_REPLICATE)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="*")
+    parser.add_argument("--repeats", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.images:
+        frames = [(path, cv2.imread(path)) for path in args.images]
+    else:
+        frames = [(f"synthetic skew {skew}", synthetic_sign(skew)) for skew in (0, 5, -12)]
+
+    encoder = ImageEncoder(format="jpeg", quality=80, max_dimension=1600)
+    cropper = TextRegionCropper()
+    for name, frame in frames:
+        full_bytes = len(encoder.encode(frame)[1])
+        cropper.apply(frame)    # warm up
+        cpu_start = time.process_time()
+        for _ in range(args.repeats):
+            crop = cropper.apply(frame)
+        cpu_ms = (time.process_time() - cpu_start) / args.repeats * 1000
+        crop_bytes = len(encoder.encode(crop)[1])
+        print(f"{name}: {frame.shape[1]}x{frame.shape[0]} -> {crop.shape[1]}x{crop.shape[0]}, "
+              f"{full_bytes} -> {crop_bytes} bytes ({100 * (1 - crop_bytes / full_bytes):.0f}% saved), "
+              f"{cropper.last_lines} lines, skew {cropper.last_skew:.1f}, {cpu_ms:.1f} ms CPU per frame")
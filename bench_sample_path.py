@@ -0,0 +1,127 @@
+'''
+File: bench_sample_path.py
+Created Date: Thursday, October 22nd 2026, 9:41:03 am
+
+Project Ver 2024
+'''
+
+### CPU per second of audio and per-chunk allocations on the way from socket reads to the output device,
+### replaying a recorded PCM answer (or the reference server's synthetic one) cut the way reads come off
+### the socket. The device is stood in for by its callback, pulled every blocksize frames.
+###   old   int16 -> float32 copy per chunk, split samples joined by concatenation, float32 device
+###   new   bytes straight into the int16 jitter buffer, int16 device
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+from jitter_buffer import JitterBuffer
+from ref_server import SAMPLERATE, synthetic_speech
+
+
+class OldPath:
+    def __init__(self, blocksize):
+        self.carry = b''
+        self.ring = np.zeros(SAMPLERATE * 2, dtype=np.float32)   # the device's float32 buffer
+        self.written = 0
+        self.read = 0
+        self.out = np.zeros((blocksize, 1), dtype=np.float32)
+
+    def feed(self, chunk):
+        data = self.carry + chunk
+        usable = len(data) & ~1
+        self.carry = data[usable:]
+        samples = np.frombuffer(data, dtype=np.int16, count=usable // 2).astype(np.float32) / 32768.0
+        start = self.written % len(self.ring)
+        first = min(len(samples), len(self.ring) - start)
+        self.ring[start:start + first] = samples[:first]
+        self.ring[:len(samples) - first] = samples[first:]
+        self.written += len(samples)
+
+    def pull(self):
+        frames = len(self.out)
+        while self.written - self.read >= frames:
+            start = self.read % len(self.ring)
+            first = min(frames, len(self.ring) - start)
+            self.out[:first, 0] = self.ring[start:start + first]
+            self.out[first:, 0] = self.ring[:frames - first]
+            self.read += frames
+
+
+class NewPath:
+    def __init__(self, blocksize):
+        self.jitter = JitterBuffer(SAMPLERATE, prebuffer_ms=0)
+        self.out = np.zeros((blocksize, 1), dtype=np.int16)
+
+    def feed(self, chunk):
+        self.jitter.write(chunk)
+
+    def pull(self):
+        frames = len(self.out)
+        while self.jitter.fill >= frames:
+            self.jitter.callback(self.out, frames, None, None)
+
+
+def socket_reads(pcm, chunk_bytes, seed=0):
+    # Reads of chunk_bytes on average, odd sizes included so samples get split
+    rng = np.random.default_rng(seed)
+    chunks, offset = [], 0
+    while offset < len(pcm):
+        size = int(rng.integers(chunk_bytes // 2, chunk_bytes * 3 // 2 + 1)) | 1 if chunk_bytes > 2 else chunk_bytes
+        chunks.append(pcm[offset:offset + size])
+        offset += size
+    return chunks
+
+
+def run(path, chunks):
+    for chunk in chunks:
+        path.feed(chunk)
+        path.pull()
+
+
+def allocations(path, chunks):
+    # Largest transient allocation seen while handling one chunk, steady state (after a warm-up)
+    run(path, chunks[:50])
+    tracemalloc.start()
+    worst = 0
+    for chunk in chunks[50:550]:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        path.feed(chunk)
+        path.pull()
+        worst = max(worst, tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return worst
+
+
+def main(args):
+    if args.pcm:
+        pcm = np.fromfile(args.pcm, dtype=np.int16).tobytes()
+    else:
+        pcm = synthetic_speech(args.seconds).tobytes()
+    seconds = len(pcm) / 2 / SAMPLERATE
+
+    for chunk_bytes in args.chunk_bytes:
+        chunks = socket_reads(pcm, chunk_bytes)
+        for name, make in (("old", OldPath), ("new", NewPath)):
+            cpu = []
+            for _ in range(args.runs):
+                path = make(args.blocksize)
+                start = time.process_time()
+                run(path, chunks)
+                cpu.append(time.process_time() - start)
+            worst = allocations(make(args.blocksize), chunks)
+            print(f"reads ~{chunk_bytes:5d} B  {name}: {1000 * min(cpu) / seconds:6.2f} ms CPU per s of audio, "
+                  f"largest allocation per chunk {worst} B")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pcm", help="recorded answer, raw 24 kHz mono int16; synthetic speech otherwise")
+    parser.add_argument("--seconds", type=float, default=20.0, help="length of the synthetic answer")
+    parser.add_argument("--chunk-bytes", type=int, nargs='+', default=[56, 4096, 16384])
+    parser.add_argument("--blocksize", type=int, default=480, help="device callback size, frames")
+    parser.add_argument("--runs", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,85 @@
+'''
+File: bench_stretch.py
+Created Date: Thursday, October 22nd 2026, 4:52:19 pm
+
+Project Ver 2024
+'''
+
+### Sustained real-time factor of the playback-speed stage (time_stretch.py): CPU time spent in the
+### device callback per second of audio played, at speeds from 1.0x to 2.5x, on a recorded answer or the
+### reference server's synthetic speech. Run it on the device, the Pi 4 is what has to keep up.
+### Also checks what the stage is for: output length is input / speed and a tone keeps its pitch,
+### including across a speed change half way through.
+
+import argparse
+import time
+
+import numpy as np
+
+from ref_server import SAMPLERATE, synthetic_speech
+from time_stretch import TimeStretcher
+
+
+def play(samples, speed, blocksize, args, change_to=None):
+    # Pulls the whole of samples through the stretcher as the output device would; returns the output
+    # and the CPU time spent in the callbacks
+    position = 0
+
+    def source(buffer, frames, time_info, status):
+        nonlocal position
+        count = max(0, min(frames, len(samples) - position))
+        buffer[:count, 0] = samples[position:position + count]
+        buffer[count:] = 0
+        position += frames
+
+    stretcher = TimeStretcher(source, SAMPLERATE, speed, frame_ms=args.frame_ms, search_ms=args.search_ms)
+    out = np.zeros((blocksize, 1), dtype=np.int16)
+    played = []
+    cpu = 0
+    while position < len(samples):
+        if change_to is not None and position >= len(samples) // 2:
+            stretcher.set_speed(change_to)
+            change_to = None
+        start = time.process_time()
+        stretcher.callback(out, blocksize, None, None)
+        cpu += time.process_time() - start
+        played.append(out[:, 0].copy())
+    return np.concatenate(played), cpu, stretcher
+
+
+def pitch(samples):
+    spectrum = np.abs(np.fft.rfft(samples * np.hanning(len(samples))))
+    return np.argmax(spectrum) * SAMPLERATE / len(samples)
+
+
+def main(args):
+    if args.pcm:
+        speech = np.fromfile(args.pcm, dtype=np.int16)
+    else:
+        speech = synthetic_speech(args.seconds)
+    seconds = len(speech) / SAMPLERATE
+    tone = (8000 * np.sin(2 * np.pi * args.tone_hz * np.arange(SAMPLERATE * 3) / SAMPLERATE)).astype(np.int16)
+
+    for speed in args.speeds:
+        out, cpu, stretcher = play(speech, speed, args.blocksize, args)
+        tone_out, _, _ = play(tone, speed, args.blocksize, args)
+        middle = tone_out[len(tone_out) // 4:3 * len(tone_out) // 4]
+        print(f"{speed:4.2f}x  RTF {cpu / (len(out) / SAMPLERATE):.4f}  "
+              f"length {len(out) / SAMPLERATE:5.2f} s of {seconds:.2f} s (expected {seconds / speed:5.2f})  "
+              f"tone {args.tone_hz:.0f} Hz -> {pitch(middle):.0f} Hz  latency {1000 * stretcher.latency:.0f} ms")
+
+    out, cpu, _ = play(speech, 1.0, args.blocksize, args, change_to=2.0)
+    print(f"1.0x -> 2.0x half way  RTF {cpu / (len(out) / SAMPLERATE):.4f}  "
+          f"length {len(out) / SAMPLERATE:5.2f} s (expected {seconds / 2 + seconds / 4:5.2f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pcm", help="recorded answer, raw 24 kHz mono int16; synthetic speech otherwise")
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of the synthetic answer")
+    parser.add_argument("--speeds", type=float, nargs='+', default=[1.0, 1.25, 1.5, 1.9, 2.0, 2.5])
+    parser.add_argument("--blocksize", type=int, default=480, help="device callback size, frames")
+    parser.add_argument("--frame-ms", type=int, default=30)
+    parser.add_argument("--search-ms", type=int, default=8)
+    parser.add_argument("--tone-hz", type=float, default=200.0)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+'''
+File: bench_two_phase.py
+Created Date: Monday, October 19th 2026, 2:05:48 pm
+
+Project Ver 2024
+'''
+
+### End-to-end time from the end of the user's question to the first audio byte in chat mode,
+### one-phase (image sent with the question) against two-phase (image sent at the button press,
+### question sent alone with its handle), through ref_server.py with a throttled uplink.
+
+import argparse
+import asyncio
+import time
+
+import aiohttp
+import numpy as np
+
+from network import multipart_body, post_image
+from ref_server import ReferenceServer, start
+
+
+async def first_byte(session, url, fields):
+    body, headers = multipart_body(fields)
+    async with session.get(url, data=body, headers=headers) as response:
+        await response.content.readany()
+        first = time.monotonic()
+        await response.read()
+        return first
+
+
+async def one_phase(session, url, image, speech_seconds):
+    await asyncio.sleep(speech_seconds)
+    spoken = time.monotonic()
+    return await first_byte(session, url, [('text', 'what is this'), ('file', image)]) - spoken
+
+
+async def two_phase(session, url, image, speech_seconds):
+    upload = asyncio.create_task(post_image(session, url + '/image', image))
+    await asyncio.sleep(speech_seconds)
+    spoken = time.monotonic()
+    image_id, _ = await upload
+    return await first_byte(session, url, [('text', 'what is this'), ('image_id', image_id)]) - spoken
+
+
+async def main(args):
+    server = ReferenceServer(think_ms=args.think_ms, answer_seconds=0.5, uplink_kbps=args.uplink_kbps)
+    runner = await start(server, port=args.port)
+    url = f'http://127.0.0.1:{args.port}'
+    image = ('image.jpg', np.random.default_rng(0).bytes(args.image_kb * 1000), 'image/jpeg')
+
+    async with aiohttp.ClientSession() as session:
+        for name, run in (("one-phase", one_phase), ("two-phase", two_phase)):
+            results = [await run(session, url, image, args.speech_seconds) for _ in range(args.runs)]
+            print(f"{name:10s} speech end -> first audio: median {1000 * np.median(results):.0f} ms, "
+                  f"max {1000 * max(results):.0f} ms")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--image-kb", type=int, default=150)
+    parser.add_argument("--uplink-kbps", type=int, default=2000)
+    parser.add_argument("--speech-seconds", type=float, default=2.5)
+    parser.add_argument("--think-ms", type=int, default=800)
+    parser.add_argument("--runs", type=int, default=5)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+'''
+File: bench_upload_ladder.py
+Created Date: Sunday, October 25th 2026, 11:06:52 am
+
+Project Ver 2024
+'''
+
+### Upload rung chosen press after press on a throttled uplink, through ref_server.py. Each press encodes
+### a test frame at the rung the bandwidth estimator picks, uploads it to /image and feeds the time back.
+###   sent    upload timed to the last byte handed to the socket (what was measured before)
+###   acked   upload timed to the server's reply, less the X-Server-Ms it reports (what is measured now)
+### With the old timing the kernel send buffer swallows the upload, the estimate runs to hundreds of MB/s
+### and the top rung is kept; timed to the acknowledgement the rung drops until uploads fit target_ms.
+
+import argparse
+import asyncio
+
+import aiohttp
+import numpy as np
+
+from image_pipeline import ImageEncoder
+from network import BandwidthEstimator, post_image
+from ref_server import ReferenceServer, start
+
+
+def test_frame(width=2028, height=1520, seed=0):
+    # Smooth shading, edges and a little sensor noise: compresses about like a photographed page
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    frame = (96 + 64 * np.sin(x / 97.0) * np.cos(y / 61.0))[..., None].repeat(3, axis=2)
+    frame[(x // 40 + y // 40) % 7 == 0] = 30
+    frame += rng.normal(0, 6, frame.shape)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+async def presses(session, url, frame, ladder, args, timing):
+    estimator = BandwidthEstimator(ladder, target_ms=args.target_ms, start_rung=0)
+    encoder = ImageEncoder()
+    rows = []
+    for _ in range(args.presses):
+        rung = estimator.choose()
+        max_dimension, quality = ladder[rung]
+        image = encoder.encode(frame, quality=quality, max_dimension=max_dimension)
+        _, body = await post_image(session, url + '/image', image)
+        seconds = body.sent - body.started if timing == "sent" else body.upload_seconds()
+        record = estimator.record_upload(rung, body.len, seconds)
+        rows.append((rung, body.len, record["upload_ms"], record["estimate_kbps"]))
+    return rows
+
+
+async def main(args):
+    server = ReferenceServer(think_ms=0, answer_seconds=0.1, uplink_kbps=args.uplink_kbps)
+    runner = await start(server, port=args.port)
+    url = f'http://127.0.0.1:{args.port}'
+    ladder = [(1600, 85), (1280, 80), (1024, 75), (800, 70), (640, 60)]
+    frame = test_frame()
+
+    async with aiohttp.ClientSession() as session:
+        for timing in ("sent", "acked"):
+            print(f"{timing}: uplink {args.uplink_kbps} kbit/s, target {args.target_ms} ms")
+            for press, (rung, nbytes, upload_ms, estimate) in enumerate(
+                    await presses(session, url, frame, ladder, args, timing)):
+                print(f"  press {press + 1:2d}  rung {rung} {ladder[rung]}  {nbytes // 1000:4d} KB  "
+                      f"upload {upload_ms:5d} ms  estimate {estimate} kbit/s")
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--uplink-kbps", type=int, default=2000)
+    parser.add_argument("--target-ms", type=int, default=300)
+    parser.add_argument("--presses", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
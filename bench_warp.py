@@ -0,0 +1,62 @@
+'''
+File: bench_warp.py
+Created Date: Sunday, October 18th 2026, 9:02:17 pm
+
+Project Ver 2024
+'''
+
+### Compares the old cvtColor -> PIL rotate(expand=True) -> NumPy path against the precomputed
+### single-warp rotate+crop+resize, on a synthetic IMAGE_WIDTH x IMAGE_HEIGHT XBGR8888 frame.
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from camera import IMAGE_WIDTH, IMAGE_HEIGHT
+from image_pipeline import RotateCropWarp
+
+
+def old_path(frame, max_dimension):
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    post_image = np.array(Image.fromarray(rgb).rotate(30, expand=True))
+    # The old path uploaded the full canvas, the resize is only here to compare like with like
+    height, width = post_image.shape[:2]
+    scale = max_dimension / max(height, width)
+    return cv2.resize(post_image, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+
+def new_path(frame, warp):
+    warped = warp.apply(frame)
+    return cv2.cvtColor(warped, cv2.COLOR_RGBA2BGR)
+
+
+def timed(fn, repeats):
+    fn()    # warm up caches and lazily built buffers
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--max-dimension", type=int, default=1280)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(0, 256, (IMAGE_HEIGHT // 8, IMAGE_WIDTH // 8, 4), dtype=np.uint8)
+    frame = cv2.resize(coarse, (IMAGE_WIDTH, IMAGE_HEIGHT), interpolation=cv2.INTER_NEAREST)
+
+    build_start = time.perf_counter()
+    warp = RotateCropWarp(IMAGE_WIDTH, IMAGE_HEIGHT, angle=30, crop="inscribed", max_dimension=args.max_dimension)
+    build_ms = (time.perf_counter() - build_start) * 1000
+    bounds = RotateCropWarp(IMAGE_WIDTH, IMAGE_HEIGHT, angle=30, crop="bounds", max_dimension=args.max_dimension)
+
+    print(f"input {IMAGE_WIDTH}x{IMAGE_HEIGHT}, warp built in {build_ms:.2f} ms")
+    print(f"old PIL rotate + resize      {timed(lambda: old_path(frame, args.max_dimension), args.repeats):7.2f} ms")
+    print(f"warp, crop=bounds   {bounds.output_size}  {timed(lambda: new_path(frame, bounds), args.repeats):7.2f} ms")
+    print(f"warp, crop=inscribed {warp.output_size} {timed(lambda: new_path(frame, warp), args.repeats):7.2f} ms")
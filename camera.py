@@ -0,0 +1,449 @@
+'''
+File: camera.py
+Created Date: Sunday, October 18th 2026, 5:40:12 pm
+
+Project Ver 2024
+'''
+
+import time
+from threading import Thread, Lock, Event, Condition
+
+import cv2
+import numpy as np
+try:
+    from picamera2 import Picamera2, MappedArray
+except ImportError:     # off-device only the fake backend can be used
+    Picamera2 = MappedArray = None
+
+
+IMAGE_WIDTH = 2203
+IMAGE_HEIGHT = 1896
+
+# libcamera AfState values
+AF_SCANNING = 1
+AF_FOCUSED = 2
+
+
+class FrameLease:
+    # Read-only view of one ring slot, the slot stays pinned until release()
+    def __init__(self, ring, slot, seq, timestamp, score, metadata):
+        self.ring = ring
+        self.slot = slot
+        self.seq = seq
+        self.timestamp = timestamp
+        self.score = score
+        self.metadata = metadata
+        self.array = ring.buffers[slot].view()
+        self.array.flags.writeable = False
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.array = None
+            self.ring.release(self.slot)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class FocusScorer:
+    # Variance of the Laplacian on a downscaled green plane (close enough to luma for focus).
+    # Buffers are reused so scoring a frame allocates nothing.
+    # The same luma plane also gives mean brightness and a scene-change measure for free.
+    def __init__(self, downscale=8, rows=None):
+        self.step = max(1, downscale // 2)
+        self.rows = rows    # only score the first rows (the Y plane of a YUV420 frame)
+        self.sub = None
+        self.luma = None
+        self.prev_luma = None
+        self.diff = None
+        self.lap = None
+        self.mean_luma = 0.0
+        self.scene_change = 0.0
+        self.last_ms = 0.0
+
+    def score(self, frame):
+        start = time.perf_counter()
+        if self.rows is not None:
+            frame = frame[:self.rows]
+        # Decimate by step with a strided view, then area-average the last 2x
+        sub_view = frame[::self.step, ::self.step, 1] if frame.ndim == 3 else frame[::self.step, ::self.step]
+        if self.sub is None or self.sub.shape != sub_view.shape:
+            h, w = sub_view.shape
+            self.sub = np.empty((h, w), dtype=np.uint8)
+            self.luma = np.empty((max(1, h // 2), max(1, w // 2)), dtype=np.uint8)
+            self.prev_luma = np.zeros(self.luma.shape, dtype=np.uint8)
+            self.diff = np.empty(self.luma.shape, dtype=np.uint8)
+            self.lap = np.empty(self.luma.shape, dtype=np.int16)
+        np.copyto(self.sub, sub_view)
+        cv2.resize(self.sub, (self.luma.shape[1], self.luma.shape[0]), dst=self.luma, interpolation=cv2.INTER_AREA)
+        cv2.Laplacian(self.luma, cv2.CV_16S, dst=self.lap)
+        _, std = cv2.meanStdDev(self.lap)
+        cv2.absdiff(self.luma, self.prev_luma, dst=self.diff)
+        self.scene_change = cv2.mean(self.diff)[0]
+        self.mean_luma = cv2.mean(self.luma)[0]
+        np.copyto(self.prev_luma, self.luma)
+        self.last_ms = (time.perf_counter() - start) * 1000
+        return float(std[0, 0]) ** 2
+
+
+class FrameRing:
+    # Preallocated frame slots written in place by the capture thread.
+    # A slot is never handed to the writer while it is the latest frame or pinned by a lease.
+    # Besides the latest frame the ring keeps the sharpest frames seen in the last `window` seconds.
+    def __init__(self, slots=4, window=1.0):
+        if slots < 2:
+            raise ValueError("FrameRing needs at least 2 slots")
+        self.slots = slots
+        self.window = window
+        self.buffers = None
+        self.pins = [0] * slots
+        self.seqs = [0] * slots         # 0 = empty, -1 = being written
+        self.timestamps = [0.0] * slots
+        self.scores = [0.0] * slots
+        self.metadata = [None] * slots
+        self.latest = -1
+        self.next_seq = 1
+        self.dropped = 0
+        self.lock = Lock()
+
+    def allocate(self, shape, dtype):
+        # One-off allocation, sized from the first frame the camera returns
+        with self.lock:
+            self.buffers = [np.empty(shape, dtype=dtype) for _ in range(self.slots)]
+
+    def acquire_write(self):
+        with self.lock:
+            horizon = time.monotonic() - self.window
+            best = None
+            best_key = None
+            for slot in range(self.slots):
+                if slot == self.latest or self.pins[slot] or self.seqs[slot] < 0:
+                    continue
+                # Reuse empty slots first, then frames outside the window, then the blurriest (oldest on ties)
+                if self.seqs[slot] == 0:
+                    age_class = 0
+                elif self.timestamps[slot] < horizon:
+                    age_class = 1
+                else:
+                    age_class = 2
+                key = (age_class, self.scores[slot], self.seqs[slot])
+                if best_key is None or key < best_key:
+                    best, best_key = slot, key
+            if best is None:
+                self.dropped += 1   # every slot is leased out, skip this frame
+                return None
+            self.seqs[best] = -1
+            return best
+
+    def commit(self, slot, timestamp=None, score=0.0, metadata=None):
+        with self.lock:
+            self.seqs[slot] = self.next_seq
+            self.timestamps[slot] = time.monotonic() if timestamp is None else timestamp
+            self.scores[slot] = score
+            self.metadata[slot] = metadata
+            self.next_seq += 1
+            self.latest = slot
+
+    def abort(self, slot):
+        with self.lock:
+            self.seqs[slot] = 0
+
+    def write(self, frame, timestamp=None, scorer=None, metadata=None):
+        if self.buffers is None:
+            self.allocate(frame.shape, frame.dtype)
+        slot = self.acquire_write()
+        if slot is None:
+            return False
+        np.copyto(self.buffers[slot], frame)
+        score = scorer.score(self.buffers[slot]) if scorer is not None else 0.0
+        self.commit(slot, timestamp, score, metadata)
+        return True
+
+    def lease(self, slot=None):
+        with self.lock:
+            if slot is None:
+                slot = self.latest
+            if slot < 0 or self.seqs[slot] <= 0:
+                return None
+            self.pins[slot] += 1
+            return FrameLease(self, slot, self.seqs[slot], self.timestamps[slot], self.scores[slot],
+                              self.metadata[slot])
+
+    def sharpest_slot(self, since=None, af_state=None):
+        # Highest focus score within the window (and since `since`, with AfState `af_state` if given),
+        # newest wins ties; falls back to the latest frame
+        with self.lock:
+            horizon = time.monotonic() - self.window
+            if since is not None:
+                horizon = max(horizon, since)
+            best = None
+            for slot in range(self.slots):
+                if self.seqs[slot] <= 0 or self.timestamps[slot] < horizon:
+                    continue
+                if af_state is not None and (self.metadata[slot] or {}).get("AfState") != af_state:
+                    continue
+                if best is None or (self.scores[slot], self.seqs[slot]) > (self.scores[best], self.seqs[best]):
+                    best = slot
+            return self.latest if best is None else best
+
+    def lease_sharpest(self, since=None, af_state=None):
+        # The chosen slot may be recycled between the two locks, lease() then returns None
+        lease = self.lease(self.sharpest_slot(since, af_state))
+        return lease if lease is not None else self.lease()
+
+    def release(self, slot):
+        with self.lock:
+            self.pins[slot] -= 1
+
+
+class CameraController:
+    # mode "video": full resolution frames streamed into the ring (original behaviour)
+    # mode "preview": only a small YUV420 stream runs, full resolution is grabbed per capture
+    # capture_path "request": frames are copied straight out of completed camera requests
+    # capture_path "array": the old capture_array() loop, kept for benchmarking
+    def __init__(self, ring_slots=4, focus_window=1.0, focus_downscale=8, select_sharpest=True,
+                 mode="video", preview_size=(320, 276), preview_fps=10,
+                 active_fps=15, idle_fps=2, idle_after=10.0,
+                 backend="picamera2", capture_path="request", af_wait=True, af_deadline_ms=300):
+        if backend == "fake":
+            from fake_camera import FakePicamera2, FakeMappedArray
+            self.picam2 = FakePicamera2()
+            self.MappedArray = FakeMappedArray
+        else:
+            self.picam2 = Picamera2()
+            self.MappedArray = MappedArray
+        self.mode = mode
+        self.capture_path = capture_path
+        self.camera_lock = Lock()
+        if mode == "preview":
+            camera_config = self.picam2.create_video_configuration(
+                main={"size": tuple(preview_size), "format": "YUV420"},
+                controls={"FrameRate": preview_fps}
+            )
+            self.still_config = self.picam2.create_still_configuration(
+                main={"size": (IMAGE_WIDTH, IMAGE_HEIGHT)},
+                buffer_count=1
+            )
+            active_fps = preview_fps
+        else:
+            camera_config = self.picam2.create_video_configuration(
+                main={"size": (IMAGE_WIDTH, IMAGE_HEIGHT)},  # 1080p resolution
+                #main={"size": (4608, 2592)},  # picam3 max resolution
+                controls={"FrameRate": active_fps}    # the sensor runs at the rate current_fps starts from
+            )
+            self.still_config = None
+        self.picam2.configure(camera_config)
+        self.picam2.set_controls({"AfMode": 2, "AfRange": 2})
+        self.picam2.start()
+        time.sleep(2)  # Allow camera to initialize
+
+        self.ring = FrameRing(ring_slots, window=focus_window)
+        if mode == "preview":
+            # Preview frames are already small, score the whole Y plane
+            self.scorer = FocusScorer(2, rows=preview_size[1])
+            self.still_ring = FrameRing(2)
+        else:
+            self.scorer = FocusScorer(focus_downscale) if select_sharpest else None
+            self.still_ring = None
+        self.select_sharpest = select_sharpest
+        self.last_still_ms = None
+
+        # Autofocus tracking from per-frame metadata, captures wait up to af_deadline_ms for a lock
+        self.af_wait = af_wait
+        self.af_deadline = af_deadline_ms / 1000
+        self.af_state = None
+        self.lens_position = None
+        self.last_scan_time = 0.0
+        self.last_af_wait_ms = None
+        self.last_af_locked = None
+        self.frame_cond = Condition()
+
+        # Capture rate follows the state machine: active_fps while busy or recently pressed, idle_fps otherwise
+        self.active_fps = active_fps
+        self.idle_fps = idle_fps
+        self.idle_after = idle_after
+        self.current_fps = active_fps
+        self.rate_lock = Lock()
+        self.state = "BOOT"
+        self.last_activity = time.monotonic()
+        self.wake_event = Event()
+        self.stats_lock = Lock()
+        self.state_stats = {}
+        self.state_since = time.monotonic()
+        self.cpu_since = time.process_time()
+
+        self.running = True
+        self.recording_thread = Thread(target=self._record_continuously)
+        self.recording_thread.start()
+
+    def _target_fps(self):
+        if self.state not in ("IDLE", "BOOT"):
+            return self.active_fps
+        if time.monotonic() - self.last_activity < self.idle_after:
+            return self.active_fps
+        return self.idle_fps
+
+    def _set_rate(self, fps):
+        with self.rate_lock:
+            if fps != self.current_fps:
+                # Slow the sensor down too, not just the copy loop
+                self.picam2.set_controls({"FrameRate": fps})
+                self.current_fps = fps
+
+    def _count_frame(self):
+        with self.stats_lock:
+            self.state_stats.setdefault(self.state, {"frames": 0, "seconds": 0.0, "cpu": 0.0})["frames"] += 1
+
+    def _record_continuously(self):
+        if self.capture_path == "array":
+            self._record_arrays()
+        else:
+            self._record_requests()
+
+    def _record_requests(self):
+        # capture_request() returns when the next frame completes, so the thread never sleeps blind.
+        # Pixels go straight from the camera buffer into a ring slot, then the buffer is handed back.
+        last_stored = 0.0
+        while self.running:
+            self._set_rate(self._target_fps())
+            with self.camera_lock:
+                request = self.picam2.capture_request()
+            try:
+                now = time.monotonic()
+                metadata = request.get_metadata()
+                self._track_af(metadata, now)
+                if now - last_stored < 0.9 / self.current_fps:
+                    continue    # sensor has not slowed down yet, drop the frame
+                last_stored = now
+                with self.MappedArray(request, "main") as mapped:
+                    self.ring.write(mapped.array, scorer=self.scorer, metadata=metadata)
+            finally:
+                request.release()
+                with self.frame_cond:
+                    self.frame_cond.notify_all()
+            self._count_frame()
+
+    def _track_af(self, metadata, now):
+        self.af_state = metadata.get("AfState")
+        self.lens_position = metadata.get("LensPosition")
+        if self.af_state == AF_SCANNING:
+            self.last_scan_time = now
+
+    def af_locked(self):
+        # Cameras without AF metadata (or the capture_array path) count as always locked
+        return self.af_state is None or self.af_state != AF_SCANNING
+
+    def wait_for_af_lock(self):
+        # Blocks until the lens stops sweeping or the deadline passes, returns (locked, waited ms)
+        start = time.monotonic()
+        with self.frame_cond:
+            locked = self.frame_cond.wait_for(self.af_locked, timeout=self.af_deadline)
+        waited_ms = (time.monotonic() - start) * 1000
+        self.last_af_wait_ms = waited_ms
+        self.last_af_locked = locked
+        print('[{}] finished in {} ms ({}, lens {})'.format(
+            'AF Wait', int(waited_ms), 'locked' if locked else 'deadline', self.lens_position))
+        return locked
+
+    def _record_arrays(self):
+        # capture_array() allocates a new frame every call, paced by sleeping
+        while self.running:
+            frame_start = time.monotonic()
+            fps = self._target_fps()
+            self._set_rate(fps)
+            with self.camera_lock:
+                frame = self.picam2.capture_array()
+            self.ring.write(frame, scorer=self.scorer)
+            self._count_frame()
+            # Sleep out the rest of the frame interval, a wake() cuts it short
+            remaining = 1 / fps - (time.monotonic() - frame_start)
+            if remaining > 0:
+                self.wake_event.wait(remaining)
+            self.wake_event.clear()
+
+    def wake(self):
+        # Called on every GPIO edge so the next frame is taken at the active rate
+        self.last_activity = time.monotonic()
+        self._set_rate(self.active_fps)
+        self.wake_event.set()
+
+    def _account_state(self):
+        now = time.monotonic()
+        cpu = time.process_time()
+        bucket = self.state_stats.setdefault(self.state, {"frames": 0, "seconds": 0.0, "cpu": 0.0})
+        bucket["seconds"] += now - self.state_since
+        bucket["cpu"] += cpu - self.cpu_since
+        self.state_since = now
+        self.cpu_since = cpu
+
+    def set_state(self, state):
+        with self.stats_lock:
+            self._account_state()
+            self.state = state
+        self.wake()
+
+    def rate_report(self):
+        # Effective capture fps and process CPU (% of one core) per state since start
+        with self.stats_lock:
+            self._account_state()
+            report = {}
+            for state, bucket in self.state_stats.items():
+                seconds = bucket["seconds"]
+                report[state] = {
+                    "seconds": round(seconds, 1),
+                    "fps": round(bucket["frames"] / seconds, 2) if seconds else 0.0,
+                    "cpu_pct": round(100 * bucket["cpu"] / seconds, 1) if seconds else 0.0,
+                }
+            return report
+
+    def preview_stats(self):
+        # What the focus scorer saw on the latest preview frame: its cost, brightness (0-255) and mean
+        # absolute change from the frame before
+        if self.scorer is None:
+            return None
+        return {
+            "focus_ms": round(self.scorer.last_ms, 2),
+            "mean_luma": round(self.scorer.mean_luma, 1),
+            "scene_change": round(self.scorer.scene_change, 1),
+        }
+
+    def capture_still(self):
+        # Switch to the full resolution configuration for one frame, then straight back to preview
+        start = time.perf_counter()
+        with self.camera_lock:
+            request = self.picam2.switch_mode_and_capture_request(self.still_config)
+        try:
+            with self.MappedArray(request, "main") as mapped:
+                self.still_ring.write(mapped.array)
+        finally:
+            request.release()
+        self.last_still_ms = (time.perf_counter() - start) * 1000
+        print('[{}] finished in {} ms'.format('Press to Frame', int(self.last_still_ms)))
+        return self.still_ring.lease()
+
+    def capture_image(self, sharpest=None, af_wait=None):
+        # Returns a FrameLease (or None before the first frame), caller must release() it
+        if af_wait is None:
+            af_wait = self.af_wait
+        locked = self.wait_for_af_lock() if af_wait else False
+        if self.mode == "preview":
+            return self.capture_still()
+        if sharpest is None:
+            sharpest = self.select_sharpest
+        if not sharpest:
+            return self.ring.lease()
+        if locked and self.af_state == AF_FOCUSED:
+            # Best frame taken since the lens last moved, falls back to the latest one
+            return self.ring.lease_sharpest(since=self.last_scan_time, af_state=AF_FOCUSED)
+        return self.ring.lease_sharpest()
+
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+        self.recording_thread.join()
+        self.picam2.stop()
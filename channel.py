@@ -0,0 +1,266 @@
+'''
+File: channel.py
+Created Date: Tuesday, October 20th 2026, 9:22:41 am
+
+Project Ver 2024
+'''
+
+### One long-lived WebSocket per device to the backend. Everything for an interaction travels over it
+### as messages: JSON text frames for control, binary frames for image and audio bytes, each binary
+### frame prefixed with the 4-byte id of the image or request it belongs to.
+###   device -> server   {"type": "image", "id", "request_id", "size"} + binary     image for a later request
+###                      {"type": "request", "id", "request_id", "text", "image", "accept"}
+###                      {"type": "cancel", "id", "request_id"}     {"type": "heartbeat", "sent"}
+### The device id goes in the X-Device-Id header of the handshake.
+###   server -> device   {"type": "image_ok", "id", "server_ms"}   server_ms: time taken after the last byte, optional
+###                      {"type": "start", "id", "content_type"} + binary audio, then {"type": "end", "id"}
+###                      {"type": "error", "id", "status", "message"}
+###                      {"type": "heartbeat", "sent"} echoed back, any other type is a server push
+
+import asyncio
+import json
+import struct
+import time
+
+import aiohttp
+
+from network import TimedBody, server_seconds, spawn
+
+
+FRAME_ID = struct.Struct('>I')
+
+
+class ChannelError(Exception):
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+class ChannelAnswer:
+    # One request's answer as it arrives on the channel, read like an HTTP response body.
+    # The queue is bounded: while the device is behind, the channel reader stops reading the socket
+    def __init__(self, channel, frame_id, request_id=None, max_frames=64):
+        self.channel = channel
+        self.id = frame_id
+        self.request_id = request_id
+        self.queue = asyncio.Queue(maxsize=max_frames)
+        self.started = asyncio.get_running_loop().create_future()
+        self.content_type = None
+        self.buffer = b''
+        self.done = False
+        self.complete = False       # the server's "end" was read
+        self.error = None           # why the answer broke off, raised once the queued audio is read
+
+    async def read(self, size=-1):
+        # Returns b'' once the answer has ended
+        if not self.buffer:
+            if self.done:
+                return b''
+            if self.error is not None and self.queue.empty():
+                self.done = True
+                raise self.error
+            item = await self.queue.get()
+            if item is None:
+                self.done = True
+                self.complete = True
+                return b''
+            if isinstance(item, Exception):
+                self.done = True
+                raise item
+            self.buffer = item
+        if size < 0 or size >= len(self.buffer):
+            chunk, self.buffer = self.buffer, b''
+        else:
+            chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    def fail(self, error):
+        # Never waits for room in the queue: the reader gets the error right after what is already queued
+        self.error = error
+        if self.queue.empty():
+            self.queue.put_nowait(error)
+
+    def close(self):
+        # Cancel: the server is told to stop without waiting for the frame to go out
+        if not self.done:
+            self.done = True
+            self.channel.counts["cancels"] += 1
+            spawn(self.channel.pending, self.channel.send({"type": "cancel", "id": self.id, "request_id": self.request_id}),
+                  "Channel cancel")
+        self.channel.forget(self.id)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.close()
+        else:
+            self.channel.forget(self.id)
+
+
+class BackendChannel:
+    def __init__(self, url, connect_timeout=2.0, max_frame=65536, device_id=None):
+        self.url = url
+        self.device_id = device_id
+        self.connect_timeout = connect_timeout
+        self.max_frame = max_frame
+        self.session = None
+        self.ws = None
+        self.reader = None
+        self.next_id = 1
+        self.answers = {}       # request id -> ChannelAnswer
+        self.images = {}        # image id -> future, done when the server has stored it
+        self.pong = None
+        self.rtt = None
+        self.pending = set()    # cancels on their way out
+        self.counts = {"connects": 0, "connect_failed": 0, "requests": 0, "cancels": 0, "pushes": 0, "heartbeats": 0}
+
+    @property
+    def connected(self):
+        return self.ws is not None and not self.ws.closed
+
+    async def connect(self):
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+        try:
+            headers = {'X-Device-Id': self.device_id} if self.device_id else None
+            self.ws = await asyncio.wait_for(
+                self.session.ws_connect(self.url, autoping=True, headers=headers), self.connect_timeout)
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+            self.counts["connect_failed"] += 1
+            raise
+        self.counts["connects"] += 1
+        self.reader = asyncio.create_task(self._read())
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            await asyncio.gather(self.reader, return_exceptions=True)
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    async def send(self, message):
+        if not self.connected:
+            raise ChannelError("channel closed")
+        await self.ws.send_str(json.dumps(message))
+
+    def forget(self, request_id):
+        answer = self.answers.pop(request_id, None)
+        if answer is not None:
+            # Unblocks the reader if it was waiting for room in this answer's queue
+            while not answer.queue.empty():
+                answer.queue.get_nowait()
+
+    async def send_image(self, image, request_id=None):
+        # Streams the image in max_frame pieces; returns its id once the server has it, and the body for timing
+        _, payload, _ = image
+        image_id = self.new_id()
+        body = TimedBody(payload)
+        stored = asyncio.get_running_loop().create_future()
+        self.images[image_id] = stored
+        try:
+            await self.send({"type": "image", "id": image_id, "request_id": request_id, "size": body.len})
+            while True:
+                chunk = body.read(self.max_frame)
+                if not chunk:
+                    break
+                await self.ws.send_bytes(FRAME_ID.pack(image_id) + chunk)
+            body.acknowledged(server_seconds(await stored))
+        finally:
+            self.images.pop(image_id, None)
+        return image_id, body
+
+    async def request(self, text, image=None, image_id=None, accept=(), request_id=None):
+        # Returns (answer, body) once the server has started answering. body times the image upload,
+        # None when the request refers to an image sent earlier
+        body = None
+        if image_id is None:
+            image_id, body = await self.send_image(image, request_id)
+        frame_id = self.new_id()
+        answer = ChannelAnswer(self, frame_id, request_id)
+        self.answers[frame_id] = answer
+        self.counts["requests"] += 1
+        try:
+            await self.send({"type": "request", "id": frame_id, "request_id": request_id, "text": text,
+                             "image": image_id, "accept": list(accept)})
+            answer.content_type = await answer.started
+        except BaseException:
+            answer.close()
+            raise
+        return answer, body
+
+    async def heartbeat(self, timeout):
+        # Round trip of an echoed heartbeat, None (and the channel closed) if it does not come back in time
+        self.pong = asyncio.get_running_loop().create_future()
+        sent = time.monotonic()
+        try:
+            await self.send({"type": "heartbeat", "sent": sent})
+            await asyncio.wait_for(self.pong, timeout)
+        except (ChannelError, asyncio.TimeoutError, ConnectionError):
+            if self.ws is not None:
+                await self.ws.close()
+            return None
+        self.counts["heartbeats"] += 1
+        self.rtt = time.monotonic() - sent
+        return self.rtt
+
+    async def _read(self):
+        try:
+            async for message in self.ws:
+                if message.type == aiohttp.WSMsgType.BINARY:
+                    (request_id,) = FRAME_ID.unpack_from(message.data)
+                    answer = self.answers.get(request_id)
+                    if answer is not None:
+                        await answer.queue.put(message.data[FRAME_ID.size:])
+                elif message.type == aiohttp.WSMsgType.TEXT:
+                    await self._dispatch(json.loads(message.data))
+                elif message.type == aiohttp.WSMsgType.ERROR:
+                    break
+        finally:
+            # Connection gone: whatever is pending fails, the caller falls back to HTTP
+            error = ChannelError("channel closed")
+            for answer in self.answers.values():
+                if not answer.started.done():
+                    answer.started.set_exception(error)
+                else:
+                    answer.fail(error)
+            for stored in self.images.values():
+                if not stored.done():
+                    stored.set_exception(error)
+
+    async def _dispatch(self, message):
+        kind = message.get("type")
+        answer = self.answers.get(message.get("id"))
+        if kind == "heartbeat":
+            if self.pong is not None and not self.pong.done():
+                self.pong.set_result(message.get("sent"))
+        elif kind == "image_ok":
+            stored = self.images.get(message.get("id"))
+            if stored is not None and not stored.done():
+                stored.set_result(message.get("server_ms"))
+        elif kind == "error":
+            error = ChannelError(message.get("message", "error"), message.get("status"))
+            stored = self.images.get(message.get("id"))
+            if stored is not None and not stored.done():
+                stored.set_exception(error)
+            elif answer is not None and not answer.started.done():
+                answer.started.set_exception(error)
+            elif answer is not None:
+                answer.fail(error)
+        elif kind in ("start", "end"):
+            if answer is None:
+                return      # cancelled on this side already
+            if kind == "start":
+                answer.started.set_result(message.get("content_type"))
+            else:
+                await answer.queue.put(None)
+        else:
+            self.counts["pushes"] += 1
+            print(f"Backend push: {message}")
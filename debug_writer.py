@@ -0,0 +1,122 @@
+'''
+File: debug_writer.py
+Created Date: Monday, October 19th 2026, 11:48:20 am
+
+Project Ver 2024
+'''
+
+import json
+import os
+import random
+import time
+from collections import deque
+from queue import Queue, Full
+from threading import Thread, Lock
+
+
+class DebugWriter:
+    # Writes sampled upload images plus a JSON sidecar of request metadata from a background thread.
+    # submit() never blocks: when the queue is full (slow SD card) the item is dropped and counted.
+    # Oldest artifacts are deleted once the directory goes over max_bytes.
+    def __init__(self, directory='debug_captures', sample_rate=1.0, max_queue=4, max_bytes=200_000_000):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.queue = Queue(maxsize=max_queue)
+        self.lock = Lock()
+        self.submitted = 0
+        self.written = 0
+        self.dropped = {"sampled_out": 0, "queue_full": 0, "write_error": 0}
+        self.deleted = 0
+        self.files = deque()    # (path, size), oldest first
+        self.disk_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._scan_existing()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _scan_existing(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                entries.append((os.path.getmtime(path), path, os.path.getsize(path)))
+        for _, path, size in sorted(entries):
+            self.files.append((path, size))
+            self.disk_bytes += size
+
+    def submit(self, image, metadata):
+        # image is the (filename, bytes, content type) upload tuple
+        with self.lock:
+            self.submitted += 1
+            if random.random() >= self.sample_rate:
+                self.dropped["sampled_out"] += 1
+                return False
+        try:
+            self.queue.put_nowait((time.time(), image, metadata))
+            return True
+        except Full:
+            with self.lock:
+                self.dropped["queue_full"] += 1
+            return False
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            created, image, metadata = item
+            try:
+                self._write(created, image, metadata)
+            except Exception as e:
+                print(f"Debug writer error: {e}")
+                with self.lock:
+                    self.dropped["write_error"] += 1
+
+    def _write(self, created, image, metadata):
+        filename, payload, _ = image
+        stem = time.strftime('%Y%m%d-%H%M%S', time.localtime(created)) + f'-{self.written + self.dropped["write_error"]:05d}'
+        image_path = os.path.join(self.directory, stem + os.path.splitext(filename)[1])
+        meta_path = os.path.join(self.directory, stem + '.json')
+        with open(image_path, 'wb') as f:
+            f.write(payload)
+        with open(meta_path, 'w') as f:
+            json.dump(metadata, f, default=str)
+        with self.lock:
+            for path in (image_path, meta_path):
+                size = os.path.getsize(path)
+                self.files.append((path, size))
+                self.disk_bytes += size
+            self.written += 1
+        self._enforce_cap()
+
+    def _enforce_cap(self):
+        while True:
+            with self.lock:
+                if self.disk_bytes <= self.max_bytes or not self.files:
+                    return
+                path, size = self.files.popleft()
+                self.disk_bytes -= size
+                self.deleted += 1
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "submitted": self.submitted,
+                "written": self.written,
+                "dropped": dict(self.dropped),
+                "deleted": self.deleted,
+                "disk_bytes": self.disk_bytes,
+            }
+
+    def stop(self):
+        try:
+            self.queue.put_nowait(None)
+        except Full:
+            pass
@@ -0,0 +1,201 @@
+'''
+File: fake_camera.py
+Created Date: Sunday, October 18th 2026, 7:05:41 pm
+
+Project Ver 2024
+'''
+
+### Stand-in for the subset of Picamera2 used by camera.py, for running and benchmarking off-device.
+### Frames "arrive" from a timer thread at the configured FrameRate into a fixed pool of buffers,
+### the way the ISP fills dmabufs, so no CPU is spent producing pixels.
+
+import time
+from threading import Thread, Condition
+
+import cv2
+import numpy as np
+
+
+class FakeRequest:
+    def __init__(self, array, metadata, release_fn=None):
+        self.array = array
+        self.metadata = metadata
+        self.release_fn = release_fn
+        self.released = False
+
+    def make_array(self, name):
+        return self.array.copy()
+
+    def get_metadata(self):
+        return dict(self.metadata)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            if self.release_fn is not None:
+                self.release_fn()
+
+
+class FakeMappedArray:
+    # Same shape as picamera2.MappedArray: a view onto the request buffer while the context is open
+    def __init__(self, request, stream, write=True):
+        self.request = request
+        self.array = None
+
+    def __enter__(self):
+        self.array = self.request.array
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.array = None
+
+
+class FakePicamera2:
+    def __init__(self, mode_switch_delay=0.12, af_period=4.0, af_sweep=0.4):
+        self.mode_switch_delay = mode_switch_delay
+        self.af_period = af_period      # continuous AF re-sweeps this often
+        self.af_sweep = af_sweep        # and each sweep lasts this long
+        self.controls = {}
+        self.config = None
+        self.buffers = []
+        self.held = []
+        self.still_buffer = None
+        self.cond = Condition()
+        self.frame_seq = 0
+        self.latest = None
+        self.metadata = {}
+        self.running = False
+        self.thread = None
+        self.started_at = time.monotonic()
+        # Bytes the camera API handed out as fresh arrays (capture_array / make_array style calls)
+        self.allocations = 0
+        self.allocated_bytes = 0
+
+    def create_video_configuration(self, main=None, lores=None, controls=None, buffer_count=6):
+        main = dict(main or {})
+        main.setdefault("format", "XBGR8888")
+        return {"use_case": "video", "main": main, "controls": dict(controls or {}), "buffer_count": buffer_count}
+
+    def create_still_configuration(self, main=None, lores=None, controls=None, buffer_count=1):
+        main = dict(main or {})
+        main.setdefault("format", "BGR888")
+        return {"use_case": "still", "main": main, "controls": dict(controls or {}), "buffer_count": buffer_count}
+
+    def _make_buffer(self, stream, sharp):
+        width, height = stream["size"]
+        fmt = stream["format"]
+        if fmt == "YUV420":
+            shape = (height * 3 // 2, width)
+        elif fmt in ("XBGR8888", "XRGB8888"):
+            shape = (height, width, 4)
+        else:
+            shape = (height, width, 3)
+        rng = np.random.default_rng(len(self.buffers))
+        # Coarse noise upscaled gives edges at a realistic scale, the blurred buffers mimic a lens mid-sweep
+        coarse = rng.integers(0, 256, (max(1, shape[0] // 8), max(1, shape[1] // 8)) + shape[2:], dtype=np.uint8)
+        buffer = cv2.resize(coarse, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+        if not sharp:
+            buffer = cv2.GaussianBlur(buffer, (0, 0), 6)
+        return buffer.reshape(shape)
+
+    def configure(self, config):
+        self.config = config
+        self.controls.update(config["controls"])
+        self.buffers = []
+        for index in range(config["buffer_count"]):
+            self.buffers.append(self._make_buffer(config["main"], sharp=index % 2 == 0))
+        self.held = [0] * len(self.buffers)
+
+    def set_controls(self, controls):
+        with self.cond:
+            self.controls.update(controls)
+
+    def start(self):
+        self.running = True
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread is not None:
+            self.thread.join()
+
+    def _af_state(self, now):
+        # libcamera AfState: 1 scanning, 2 focused
+        if self.controls.get("AfMode") != 2:
+            return 2
+        phase = (now - self.started_at) % self.af_period
+        return 1 if phase < self.af_sweep else 2
+
+    def _run(self):
+        index = 0
+        next_frame = time.monotonic()
+        while self.running:
+            with self.cond:
+                interval = 1 / self.controls.get("FrameRate", 30)
+            next_frame += interval
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_frame = time.monotonic()
+            now = time.monotonic()
+            with self.cond:
+                # Skip buffers still held by the application, like a starved request queue
+                for _ in range(len(self.buffers)):
+                    index = (index + 1) % len(self.buffers)
+                    if not self.held[index]:
+                        break
+                else:
+                    continue
+                af_state = self._af_state(now)
+                self.frame_seq += 1
+                self.latest = index
+                self.metadata = {
+                    "SensorTimestamp": time.monotonic_ns(),
+                    "FrameDuration": int(interval * 1_000_000),
+                    "AfState": af_state,
+                    "LensPosition": 2.0 if af_state == 2 else 2.0 + (now % 1.0),
+                }
+                self.cond.notify_all()
+
+    def _wait_frame(self):
+        with self.cond:
+            seq = self.frame_seq
+            self.cond.wait_for(lambda: self.frame_seq != seq or not self.running)
+            return self.latest, dict(self.metadata)
+
+    def capture_array(self, name="main"):
+        index, _ = self._wait_frame()
+        array = self.buffers[index].copy()
+        self.allocations += 1
+        self.allocated_bytes += array.nbytes
+        return array
+
+    def capture_request(self):
+        index, metadata = self._wait_frame()
+        with self.cond:
+            self.held[index] += 1
+
+        def release():
+            with self.cond:
+                self.held[index] -= 1
+        return FakeRequest(self.buffers[index], metadata, release)
+
+    def capture_metadata(self):
+        return self._wait_frame()[1]
+
+    def _still(self, config):
+        time.sleep(self.mode_switch_delay)
+        if self.still_buffer is None:
+            self.still_buffer = self._make_buffer(config["main"], sharp=True)
+        return self.still_buffer
+
+    def switch_mode_and_capture_array(self, config, name="main"):
+        array = self._still(config).copy()
+        self.allocations += 1
+        self.allocated_bytes += array.nbytes
+        return array
+
+    def switch_mode_and_capture_request(self, config):
+        return FakeRequest(self._still(config), dict(self.metadata))
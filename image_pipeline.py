@@ -0,0 +1,294 @@
+'''
+File: image_pipeline.py
+Created Date: Sunday, October 18th 2026, 8:12:55 pm
+
+Project Ver 2024
+'''
+
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameQualityGate:
+    # Cheap luma statistics on a decimated frame to catch frames not worth a server round trip.
+    # Reasons: "covered" (dark and flat, e.g. a finger on the lens), "too_dark", "washed_out", "blank".
+    def __init__(self, enabled=True, downscale=16, covered_mean=15, covered_std=6,
+                 dark_mean=30, bright_mean=235, clip_fraction=0.85, blank_std=4):
+        self.enabled = enabled
+        self.step = max(1, downscale)
+        self.covered_mean = covered_mean
+        self.covered_std = covered_std
+        self.dark_mean = dark_mean
+        self.bright_mean = bright_mean
+        self.clip_fraction = clip_fraction
+        self.blank_std = blank_std
+        self.sub = None
+        self.passed = 0
+        self.rejections = {"covered": 0, "too_dark": 0, "washed_out": 0, "blank": 0}
+        self.last_ms = 0.0
+        self.last_stats = None
+
+    def measure(self, frame):
+        # Green channel stands in for luma, strided so only ~1/step^2 of the frame is read
+        sub_view = frame[::self.step, ::self.step, 1] if frame.ndim == 3 else frame[::self.step, ::self.step]
+        if self.sub is None or self.sub.shape != sub_view.shape:
+            self.sub = np.empty(sub_view.shape, dtype=np.uint8)
+        np.copyto(self.sub, sub_view)
+        mean, std = cv2.meanStdDev(self.sub)
+        clipped = np.count_nonzero(self.sub >= 250) / self.sub.size
+        return {"mean": float(mean[0, 0]), "std": float(std[0, 0]), "clipped": clipped}
+
+    def check(self, frame):
+        # Returns None when the frame is usable, otherwise the rejection reason
+        if not self.enabled:
+            return None
+        start = time.perf_counter()
+        stats = self.measure(frame)
+        if stats["mean"] < self.covered_mean and stats["std"] < self.covered_std:
+            reason = "covered"
+        elif stats["mean"] < self.dark_mean:
+            reason = "too_dark"
+        elif stats["mean"] > self.bright_mean or stats["clipped"] > self.clip_fraction:
+            reason = "washed_out"
+        elif stats["std"] < self.blank_std:
+            reason = "blank"
+        else:
+            reason = None
+        self.last_ms = (time.perf_counter() - start) * 1000
+        self.last_stats = stats
+        if reason is None:
+            self.passed += 1
+        else:
+            self.rejections[reason] += 1
+        return reason
+
+    def counters(self):
+        return {"passed": self.passed, **self.rejections}
+
+
+class ImageEncoder:
+    # In-memory encode of the upload payload, returns a (filename, bytes, content type) tuple for requests
+    FORMATS = {
+        "jpeg": (".jpg", "image/jpeg"),
+        "png": (".png", "image/png"),
+        "webp": (".webp", "image/webp"),
+    }
+
+    def __init__(self, format="jpeg", quality=85, max_dimension=1280):
+        if format not in self.FORMATS:
+            raise ValueError(f"Unsupported upload format: {format}")
+        self.format = format
+        self.quality = quality
+        self.max_dimension = max_dimension
+        self.last_ms = 0.0
+        self.last_bytes = 0
+
+    def params(self, quality=None):
+        quality = self.quality if quality is None else quality
+        if self.format == "jpeg":
+            return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+        if self.format == "webp":
+            return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+        return [cv2.IMWRITE_PNG_COMPRESSION, 1]
+
+    def encode(self, image, quality=None, max_dimension=None):
+        # image is BGR (OpenCV order)
+        start = time.perf_counter()
+        max_dimension = self.max_dimension if max_dimension is None else max_dimension
+        height, width = image.shape[:2]
+        if max_dimension and max(height, width) > max_dimension:
+            scale = max_dimension / max(height, width)
+            image = cv2.resize(image, (max(1, int(width * scale)), max(1, int(height * scale))),
+                               interpolation=cv2.INTER_AREA)
+        extension, content_type = self.FORMATS[self.format]
+        ok, encoded = cv2.imencode(extension, image, self.params(quality))
+        if not ok:
+            raise RuntimeError(f"Failed to encode image as {self.format}")
+        payload = encoded.tobytes()
+        self.last_ms = (time.perf_counter() - start) * 1000
+        self.last_bytes = len(payload)
+        return ("best_image_q" + extension, payload, content_type)
+
+
+def inscribed_size(width, height, angle):
+    # Largest axis-aligned rectangle inside a width x height image rotated by angle degrees
+    if width <= 0 or height <= 0:
+        return 0, 0
+    radians = np.radians(angle)
+    sin_a, cos_a = abs(np.sin(radians)), abs(np.cos(radians))
+    long_side, short_side = max(width, height), min(width, height)
+    if short_side <= 2 * sin_a * cos_a * long_side or abs(sin_a - cos_a) < 1e-10:
+        # Half constrained: two crop corners touch the longer side
+        x = 0.5 * short_side
+        if width >= height:
+            crop_w, crop_h = x / sin_a, x / cos_a
+        else:
+            crop_w, crop_h = x / cos_a, x / sin_a
+    else:
+        # Fully constrained: the crop touches all four sides
+        cos_2a = cos_a * cos_a - sin_a * sin_a
+        crop_w = (width * cos_a - height * sin_a) / cos_2a
+        crop_h = (height * cos_a - width * sin_a) / cos_2a
+    return int(crop_w), int(crop_h)
+
+
+class RotateCropWarp:
+    # Mount rotation, crop and downscale folded into one affine transform, built once per input size,
+    # so each frame is a single cv2.warpAffine into a reused output buffer.
+    # crop "inscribed" drops the black corners, "bounds" keeps the whole rotated frame like PIL's expand=True.
+    def __init__(self, width, height, angle=30, crop="inscribed", max_dimension=1280):
+        self.angle = angle
+        self.crop = crop
+        self.max_dimension = max_dimension
+        self.build(width, height)
+
+    def build(self, width, height):
+        self.input_size = (width, height)
+        if self.crop == "inscribed":
+            crop_w, crop_h = inscribed_size(width, height, self.angle)
+        else:
+            radians = np.radians(self.angle)
+            sin_a, cos_a = abs(np.sin(radians)), abs(np.cos(radians))
+            crop_w, crop_h = int(width * cos_a + height * sin_a), int(width * sin_a + height * cos_a)
+        scale = 1.0
+        if self.max_dimension and max(crop_w, crop_h) > self.max_dimension:
+            scale = self.max_dimension / max(crop_w, crop_h)
+        out_w, out_h = max(1, int(crop_w * scale)), max(1, int(crop_h * scale))
+
+        # Positive angle is counter-clockwise, same as PIL's Image.rotate
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), self.angle, scale)
+        matrix[0, 2] += out_w / 2 - width / 2
+        matrix[1, 2] += out_h / 2 - height / 2
+        self.matrix = matrix
+        self.output_size = (out_w, out_h)
+        self.output = None
+
+    def apply(self, frame):
+        height, width = frame.shape[:2]
+        if (width, height) != self.input_size:
+            self.build(width, height)
+        channels = frame.shape[2:]
+        if self.output is None or self.output.shape[2:] != channels or self.output.dtype != frame.dtype:
+            self.output = np.empty((self.output_size[1], self.output_size[0]) + channels, dtype=frame.dtype)
+        cv2.warpAffine(frame, self.matrix, self.output_size, dst=self.output, flags=cv2.INTER_LINEAR,
+                       borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+        return self.output
+
+
+class TextRegionCropper:
+    # Read mode: crop to the text-dense part of the frame, deskew it and boost contrast before upload.
+    # Detection runs on a detect_width grey copy: morphological gradient and Otsu give stroke pixels,
+    # a wide close joins characters into line/paragraph blobs. Blobs wider than tall whose pixels are
+    # roughly half strokes count as text; plain edges close into blobs that are nearly all stroke.
+    def __init__(self, detect_width=800, margin=0.03, min_line_height=6, min_area=0.002, max_area=0.6,
+                 min_density=0.25, max_density=0.8,
+                 grayscale=True, clip_limit=2.0, max_skew=20):
+        self.detect_width = detect_width
+        self.margin = margin
+        self.min_line_height = min_line_height
+        self.min_area = min_area
+        self.max_area = max_area
+        self.min_density = min_density
+        self.max_density = max_density
+        self.grayscale = grayscale
+        self.max_skew = max_skew
+        self.clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=(8, 8))
+        self.gradient_kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (21, 5))
+        self.last_ms = 0.0
+        self.last_lines = 0
+        self.last_skew = 0.0
+
+    def find_lines(self, gray):
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, self.gradient_kernel)
+        _, strokes = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        joined = cv2.morphologyEx(strokes, cv2.MORPH_CLOSE, self.line_kernel)
+        count, labels, stats, _ = cv2.connectedComponentsWithStats(joined, connectivity=8)
+        # Stroke pixels per blob, all blobs at once
+        filled = np.bincount(labels[strokes > 0], minlength=count)
+        widths = stats[:, cv2.CC_STAT_WIDTH]
+        heights = stats[:, cv2.CC_STAT_HEIGHT]
+        blob_area = np.maximum(stats[:, cv2.CC_STAT_AREA], 1)
+        density = filled / blob_area
+        image_area = gray.shape[0] * gray.shape[1]
+        keep = ((widths >= heights) & (heights >= self.min_line_height)
+                & (blob_area >= self.min_area * image_area) & (widths * heights <= self.max_area * image_area)
+                & (density > self.min_density) & (density < self.max_density))
+        keep[0] = False     # background
+        return stats[keep], strokes
+
+    def skew_score(self, strokes, angle):
+        # Text rows line up when the angle is right, which makes the row sums spiky
+        height, width = strokes.shape
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        rotated = cv2.warpAffine(strokes, matrix, (width, height), flags=cv2.INTER_NEAREST)
+        rows = cv2.reduce(rotated, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S)
+        return float(np.var(rows))
+
+    def estimate_skew(self, strokes):
+        # Projection profile search, 2 degree steps then 0.5 degree around the best
+        if cv2.countNonZero(strokes) < 50:
+            return 0.0
+        coarse = np.arange(-self.max_skew, self.max_skew + 1, 2.0)
+        best = max(coarse, key=lambda angle: self.skew_score(strokes, angle))
+        fine = np.arange(best - 1.5, best + 1.75, 0.5)
+        return float(max(fine, key=lambda angle: self.skew_score(strokes, angle)))
+
+    def apply(self, image):
+        # image is BGR; returns the processed crop, or the image untouched if no text was found
+        start = time.perf_counter()
+        height, width = image.shape[:2]
+        scale = min(1.0, self.detect_width / width)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        small = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA) \
+            if scale < 1.0 else gray
+        lines, strokes = self.find_lines(small)
+        self.last_lines = len(lines)
+        if len(lines) == 0:
+            self.last_ms = (time.perf_counter() - start) * 1000
+            return image
+
+        x0 = lines[:, cv2.CC_STAT_LEFT].min()
+        y0 = lines[:, cv2.CC_STAT_TOP].min()
+        x1 = (lines[:, cv2.CC_STAT_LEFT] + lines[:, cv2.CC_STAT_WIDTH]).max()
+        y1 = (lines[:, cv2.CC_STAT_TOP] + lines[:, cv2.CC_STAT_HEIGHT]).max()
+        self.last_skew = self.estimate_skew(strokes[y0:y1, x0:x1])
+
+        pad_x, pad_y = int(self.margin * width), int(self.margin * height)
+        left = max(0, int(x0 / scale) - pad_x)
+        top = max(0, int(y0 / scale) - pad_y)
+        right = min(width, int(x1 / scale) + pad_x)
+        bottom = min(height, int(y1 / scale) + pad_y)
+        crop = gray[top:bottom, left:right] if self.grayscale else image[top:bottom, left:right]
+
+        if abs(self.last_skew) > 0.5:
+            crop_h, crop_w = crop.shape[:2]
+            matrix = cv2.getRotationMatrix2D((crop_w / 2, crop_h / 2), self.last_skew, 1.0)
+            crop = cv2.warpAffine(crop, matrix, (crop_w, crop_h), flags=cv2.INTER_LINEAR,
+                                  borderMode=cv2.BORDER_REPLICATE)
+
+        if self.grayscale:
+            crop = self.clahe.apply(crop)
+        else:
+            lab = cv2.cvtColor(crop, cv2.COLOR_BGR2LAB)
+            lab[:, :, 0] = self.clahe.apply(lab[:, :, 0])
+            crop = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        self.last_ms = (time.perf_counter() - start) * 1000
+        return crop
+
+
+def perceptual_hash(image, size=8):
+    # 64-bit difference hash: brightness gradient between neighbours on a size+1 x size thumbnail.
+    # Survives small shifts, exposure changes and re-encoding, so the same scene hashes a few bits apart
+    step = max(1, min(image.shape[:2]) // (16 * size))    # decimate first, the thumbnail averages the rest
+    sub = image[::step, ::step]
+    gray = cv2.cvtColor(sub, cv2.COLOR_BGR2GRAY) if sub.ndim == 3 else sub
+    thumb = cv2.resize(gray, (size + 1, size), interpolation=cv2.INTER_AREA)
+    bits = np.packbits(thumb[:, 1:] > thumb[:, :-1])
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
@@ -0,0 +1,138 @@
+'''
+File: jitter_buffer.py
+Created Date: Wednesday, October 21st 2026, 2:36:50 pm
+
+Project Ver 2024
+'''
+
+from threading import Event, Lock
+
+import numpy as np
+
+
+class JitterBuffer:
+    # Preallocated int16 ring between the network reader (write(), on the event loop) and a callback-mode
+    # int16 output stream (callback(), on the audio thread), so samples are only ever copied, never
+    # converted or reallocated. Playback starts once prebuffer_ms is queued. An underrun pauses it until the ring has refilled, with the prebuffer raised by half
+    # (up to max_prebuffer_ms); a stream without underruns lowers it again for the next one.
+    # Overruns are writes that found the ring full and had to wait for playback to make room.
+    def __init__(self, samplerate=24000, channels=1, capacity_ms=2000, prebuffer_ms=200, max_prebuffer_ms=800):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.capacity = samplerate * capacity_ms // 1000
+        self.base_prebuffer = min(samplerate * prebuffer_ms // 1000, self.capacity)
+        self.max_prebuffer = min(max(samplerate * max_prebuffer_ms // 1000, self.base_prebuffer), self.capacity)
+        self.prebuffer = self.base_prebuffer
+        self.ring = np.zeros((self.capacity, channels), dtype=np.int16)
+        self.ring_bytes = self.ring.reshape(-1).view(np.uint8)     # the same memory, for raw PCM writes
+        self.frame_bytes = self.ring.itemsize * channels
+        self.lock = Lock()
+        self.drained = Event()      # set once a finished stream has played out
+        self.underruns = 0
+        self.reset()
+
+    def reset(self):
+        # Ready for a new stream, the prebuffer carries over from the last one
+        with self.lock:
+            if self.underruns == 0:
+                self.prebuffer = max(self.base_prebuffer, self.prebuffer * 3 // 4)
+            self.read = 0           # total samples played
+            self.written = 0        # total bytes queued, may end part way through a sample
+            self.playing = False
+            self.finished = False
+            self.underruns = 0
+            self.overruns = 0
+            self.device_xruns = 0
+            self.fill_min = None
+            self.fill_max = 0
+            self.fill_sum = 0
+            self.fill_low = 0       # callbacks that found less than the prebuffer queued
+            self.callbacks = 0
+            self.drained.clear()
+
+    @property
+    def fill(self):
+        # Whole samples queued
+        return self.written // self.frame_bytes - self.read
+
+    def write(self, data):
+        # Copies as many bytes of little-endian int16 audio as fit, returns how many; the caller waits and
+        # writes the rest later. data is anything bytes-like: a socket read as is, or an int16 array.
+        # A read that ends part way through a sample leaves that byte in the ring, the next write completes it
+        data = np.frombuffer(data, dtype=np.uint8)
+        size = len(self.ring_bytes)
+        with self.lock:
+            count = min(len(data), size - (self.written - self.read * self.frame_bytes))
+            start = self.written % size
+        if count < len(data):
+            self.overruns += 1
+        first = min(count, size - start)
+        self.ring_bytes[start:start + first] = data[:first]
+        if first < count:
+            self.ring_bytes[:count - first] = data[first:count]
+        with self.lock:
+            self.written += count
+        return count
+
+    def finish(self):
+        # No more samples coming: play the tail even if it is shorter than the prebuffer
+        with self.lock:
+            self.finished = True
+            if self.written // self.frame_bytes == self.read:
+                self.drained.set()
+
+    def clear(self):
+        # Cancel: drop whatever is queued
+        with self.lock:
+            self.written -= self.written % self.frame_bytes
+            self.read = self.written // self.frame_bytes
+            self.finished = True
+            self.drained.set()
+
+    def callback(self, outdata, frames, time, status):
+        # sounddevice OutputStream callback
+        with self.lock:
+            if status:
+                self.device_xruns += 1
+            fill = self.written // self.frame_bytes - self.read
+            if not self.playing and (fill >= self.prebuffer or self.finished):
+                self.playing = True
+            count = min(fill, frames) if self.playing else 0
+            start = self.read % self.capacity
+        first = min(count, self.capacity - start)
+        outdata[:first] = self.ring[start:start + first]
+        if first < count:
+            outdata[first:count] = self.ring[:count - first]
+        if count < frames:
+            outdata[count:] = 0
+        with self.lock:
+            self.read += count
+            if self.playing and not self.finished:     # the tail running out is not a low buffer
+                self.callbacks += 1
+                self.fill_sum += fill
+                self.fill_max = max(self.fill_max, fill)
+                self.fill_min = fill if self.fill_min is None else min(self.fill_min, fill)
+                if fill < self.prebuffer:
+                    self.fill_low += 1
+            if self.playing and count < frames:
+                if self.finished:
+                    self.drained.set()
+                else:
+                    self.underruns += 1
+                    self.playing = False
+                    self.prebuffer = min(self.prebuffer * 3 // 2, self.max_prebuffer)
+
+    def report(self):
+        # How the stream went: xruns and the buffer level seen by the device, in ms
+        def ms(samples):
+            return round(1000 * samples / self.samplerate)
+        with self.lock:
+            return {
+                "underruns": self.underruns,
+                "overruns": self.overruns,
+                "device_xruns": self.device_xruns,
+                "prebuffer_ms": ms(self.prebuffer),
+                "fill_ms": {"min": ms(self.fill_min or 0), "mean": ms(self.fill_sum / max(self.callbacks, 1)),
+                            "max": ms(self.fill_max)},
+                "below_prebuffer": round(self.fill_low / self.callbacks, 2) if self.callbacks else None,
+            }
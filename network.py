@@ -0,0 +1,301 @@
+'''
+File: network.py
+Created Date: Monday, October 19th 2026, 9:14:03 am
+
+Project Ver 2024
+'''
+
+import asyncio
+import io
+import time
+from collections import deque
+from threading import Lock
+
+import aiohttp
+from urllib3 import encode_multipart_formdata
+
+
+SERVER_TIME_HEADER = 'X-Server-Ms'
+
+
+def server_seconds(value):
+    # What a backend reports spending between reading a request body and replying, 0 when it does not say
+    try:
+        return max(float(value), 0.0) / 1000
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class TimedBody:
+    # Request body (file-like or async iterable) timed from its first byte handed to the socket to the server
+    # acknowledging it (acknowledged(), called on the reply). The last read only means the bytes reached the
+    # kernel send buffer, which on a slow uplink is most of the upload still to go.
+    def __init__(self, payload):
+        self.buffer = io.BytesIO(payload)
+        self.len = len(payload)
+        self.started = None
+        self.sent = None            # last byte handed to the socket
+        self.finished = None        # server's reply, less the time it says it took before replying
+
+    def read(self, size=-1):
+        if self.started is None:
+            self.started = time.monotonic()
+        chunk = self.buffer.read(size)
+        if not chunk and self.sent is None:
+            self.sent = time.monotonic()
+        return chunk
+
+    def acknowledged(self, server_time=0.0):
+        if self.started is not None and self.finished is None:
+            self.finished = max(time.monotonic() - server_time, self.sent or self.started)
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self, size=65536):
+        # aiohttp drains the socket between chunks, the last one returns when the buffer has taken it
+        while True:
+            chunk = self.read(size)
+            if not chunk:
+                break
+            yield chunk
+
+    def upload_seconds(self):
+        # None until the server has acknowledged the body
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+def multipart_body(fields):
+    # Same multipart form as files=/data= would build, sent from a body that times the upload
+    body, content_type = encode_multipart_formdata(fields)
+    body = TimedBody(body)
+    return body, {'Content-Type': content_type, 'Content-Length': str(body.len)}
+
+
+def request_headers(device_id, request_id):
+    # Identity on every request, so a cancel can name exactly the request to stop
+    return {'X-Device-Id': device_id, 'X-Request-Id': request_id}
+
+
+def spawn(pending, awaitable, what):
+    # Runs awaitable (a coroutine or a future) in the background, held in pending until it ends.
+    # A failure is printed instead of surfacing later as an unretrieved task exception
+    future = asyncio.ensure_future(awaitable)
+    pending.add(future)
+
+    def finished(done):
+        pending.discard(done)
+        if not done.cancelled() and done.exception() is not None:
+            print(f"{what} failed: {done.exception()}")
+
+    future.add_done_callback(finished)
+    return future
+
+
+async def post_image(session, url, image, extra_headers=None):
+    # First phase of a two-phase request: the image goes up alone and the server hands back an id
+    # that the question refers to. Returns the id and the body, for its upload timing
+    body, headers = multipart_body([('file', image)])
+    headers.update(extra_headers or {})
+    async with session.post(url, data=body, headers=headers) as response:
+        response.raise_for_status()
+        body.acknowledged(server_seconds(response.headers.get(SERVER_TIME_HEADER)))
+        return (await response.json())["image_id"], body
+
+
+class DeadlineExceeded(Exception):
+    # reason is the budget that ran out: connect, first_byte or stall (or unreachable when refused,
+    # http_error when every endpoint answered with an error status)
+    def __init__(self, reason):
+        super().__init__(f"{reason} deadline exceeded")
+        self.reason = reason
+
+
+class HttpAnswer:
+    # An aiohttp response seen through the same calls as a WebSocket channel answer
+    def __init__(self, response):
+        self.response = response
+        self.content_type = response.headers.get('Content-Type')
+        self.complete = False       # the whole body was read
+
+    async def read(self, size=-1):
+        chunk = await self.response.content.read(size)
+        if not chunk:
+            self.complete = True
+        return chunk
+
+    def close(self):
+        # Drops the socket rather than draining the body
+        self.response.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.response.release()
+
+
+class BandwidthEstimator:
+    # Picks an upload rung (max dimension, JPEG quality) from a ladder, best first,
+    # so the predicted upload time stays under target_ms at the measured throughput.
+    def __init__(self, ladder, target_ms=300, alpha=0.3, start_rung=1):
+        self.ladder = [tuple(rung) for rung in ladder]
+        self.target = target_ms / 1000
+        self.alpha = alpha
+        self.start_rung = min(start_rung, len(self.ladder) - 1)
+        self.throughput = None      # bytes per second, exponentially weighted
+        self.rung_bytes = {}        # typical payload size per rung, same weighting
+        self.history = deque(maxlen=50)
+
+    def predict_bytes(self, rung):
+        if rung in self.rung_bytes:
+            return self.rung_bytes[rung]
+        if not self.rung_bytes:
+            return None
+        # Scale from the closest measured rung by pixel count
+        known = min(self.rung_bytes, key=lambda other: abs(other - rung))
+        return self.rung_bytes[known] * (self.ladder[rung][0] / self.ladder[known][0]) ** 2
+
+    def choose(self):
+        if self.throughput is None:
+            return self.start_rung
+        for rung in range(len(self.ladder)):
+            predicted = self.predict_bytes(rung)
+            if predicted is None or predicted / self.throughput <= self.target:
+                return rung
+        return len(self.ladder) - 1
+
+    def record_upload(self, rung, nbytes, seconds):
+        seconds = max(seconds, 0.001)
+        sample = nbytes / seconds
+        if self.throughput is None:
+            self.throughput = sample
+        else:
+            self.throughput += self.alpha * (sample - self.throughput)
+        if rung is not None:
+            previous = self.rung_bytes.get(rung, nbytes)
+            self.rung_bytes[rung] = previous + self.alpha * (nbytes - previous)
+        record = {
+            "rung": rung,
+            "dimension": self.ladder[rung][0] if rung is not None else None,
+            "quality": self.ladder[rung][1] if rung is not None else None,
+            "bytes": nbytes,
+            "upload_ms": int(seconds * 1000),
+            "sample_kbps": int(sample * 8 / 1000),
+            "estimate_kbps": int(self.throughput * 8 / 1000),
+        }
+        self.history.append(record)
+        return record
+
+
+class ConnectionCounters:
+    # How many requests had to open a socket versus reuse a warm one
+    def __init__(self):
+        self.lock = Lock()
+        self.counts = {"connect": 0, "reuse": 0, "probe_ok": 0, "probe_failed": 0}
+        self.connect_ms = deque(maxlen=50)
+
+    def add(self, name, connect_ms=None):
+        with self.lock:
+            self.counts[name] += 1
+            if connect_ms is not None:
+                self.connect_ms.append(connect_ms)
+
+    def snapshot(self):
+        with self.lock:
+            report = dict(self.counts)
+            if self.connect_ms:
+                report["avg_connect_ms"] = round(sum(self.connect_ms) / len(self.connect_ms), 1)
+            return report
+
+
+def keeps_alive(response):
+    # Whether an answer can leave its connection in the pool: its body, empty for HEAD included, has to be
+    # framed by Content-Length or chunked encoding, otherwise only closing the socket ends it
+    if response.headers.get('Connection', '').lower() == 'close':
+        return False
+    return 'Content-Length' in response.headers or 'chunked' in response.headers.get('Transfer-Encoding', '').lower()
+
+
+def counting_trace(counters):
+    # aiohttp trace hooks: a request on a new connection pays for TCP (and TLS) setup, a pooled one does not
+    trace = aiohttp.TraceConfig()
+
+    async def on_create_start(session, context, params):
+        context.connect_start = time.perf_counter()
+
+    async def on_create_end(session, context, params):
+        counters.add("connect", (time.perf_counter() - context.connect_start) * 1000)
+
+    async def on_reuse(session, context, params):
+        counters.add("reuse")
+
+    trace.on_connection_create_start.append(on_create_start)
+    trace.on_connection_create_end.append(on_create_end)
+    trace.on_connection_reuseconn.append(on_reuse)
+    return trace
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+        self.rtt = None         # seconds, exponentially weighted over probes
+        self.healthy = True
+        self.failed_at = 0
+        self.last_ok = 0        # last successful probe or request, for skipping redundant probes
+        self.pooled = True      # False while its probe answers close the connection instead of keeping it warm
+        self.counts = {"probe_ok": 0, "probe_failed": 0, "requests": 0, "failed": 0}
+        self.ttfb = deque(maxlen=50)
+
+
+class BackendRegistry:
+    # Backends from config, ranked for each request: healthy ones by probe round trip (config order
+    # until measured), then unhealthy ones oldest failure first, so the likeliest to have recovered leads
+    def __init__(self, urls, alpha=0.3):
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.alpha = alpha
+
+    def ranked(self):
+        healthy = sorted((e for e in self.endpoints if e.healthy), key=lambda e: float('inf') if e.rtt is None else e.rtt)
+        unhealthy = sorted((e for e in self.endpoints if not e.healthy), key=lambda e: e.failed_at)
+        return healthy + unhealthy
+
+    def best(self):
+        return self.ranked()[0]
+
+    def record_probe(self, endpoint, rtt):
+        if rtt is None:
+            endpoint.counts["probe_failed"] += 1
+            endpoint.healthy = False
+            endpoint.failed_at = time.monotonic()
+            return
+        endpoint.counts["probe_ok"] += 1
+        endpoint.rtt = rtt if endpoint.rtt is None else endpoint.rtt + self.alpha * (rtt - endpoint.rtt)
+        endpoint.healthy = True
+        endpoint.last_ok = time.monotonic()
+
+    def record_request(self, endpoint, ttfb):
+        endpoint.counts["requests"] += 1
+        endpoint.ttfb.append(ttfb)
+        endpoint.healthy = True
+        endpoint.last_ok = time.monotonic()
+
+    def record_failure(self, endpoint):
+        endpoint.counts["failed"] += 1
+        endpoint.healthy = False
+        endpoint.failed_at = time.monotonic()
+
+    def stats(self):
+        report = {}
+        for endpoint in self.endpoints:
+            ttfb = sorted(endpoint.ttfb)
+            report[endpoint.url] = dict(
+                endpoint.counts,
+                healthy=endpoint.healthy,
+                pooled=endpoint.pooled,
+                rtt_ms=None if endpoint.rtt is None else round(endpoint.rtt * 1000, 1),
+                ttfb_p50_ms=int(ttfb[len(ttfb) // 2] * 1000) if ttfb else None,
+                ttfb_p90_ms=int(ttfb[int(len(ttfb) * 0.9)] * 1000) if ttfb else None)
+        return report
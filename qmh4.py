@@ -8,7 +8,7 @@ Project Ver 2024
 
 import os
 import time
-import requests
+import uuid
 from datetime import timedelta
 
 import select
@@ -19,6 +19,7 @@ from enum import Enum
 
 import asyncio
 import threading
+from concurrent.futures import ThreadPoolExecutor
 
 import sounddevice as sd
 import soundfile as sf
@@ -31,14 +32,24 @@ import re
 from vosk import Model, KaldiRecognizer
 import json
 
-from picamera2 import Picamera2, controls
-from libcamera import Transform, controls
 import cv2
 import numpy as np
-from PIL import Image
 
 import toml
-from threading import Thread, Lock
+from threading import Lock
+import aiohttp
+
+from camera import CameraController, IMAGE_WIDTH, IMAGE_HEIGHT
+from image_pipeline import FrameQualityGate, ImageEncoder, RotateCropWarp, TextRegionCropper, perceptual_hash
+from network import (BandwidthEstimator, BackendRegistry, ConnectionCounters, DeadlineExceeded, HttpAnswer,
+                     SERVER_TIME_HEADER, counting_trace, keeps_alive, multipart_body, post_image, request_headers,
+                     server_seconds, spawn)
+from channel import BackendChannel, ChannelError
+from debug_writer import DebugWriter
+from audio_codec import accept_header, available_codecs, decoder_for, is_audio_type
+from response_cache import ResponseCache
+from jitter_buffer import JitterBuffer
+from time_stretch import TimeStretcher
 
 
 FALLING_EDGE = "Falling"
@@ -47,47 +58,6 @@ GPIO_A = 2
 GPIO_B = 3
 GPIO_C = 4
 
-IMAGE_WIDTH = 2203
-IMAGE_HEIGHT = 1896
-
-class CameraController:
-    def __init__(self):
-        self.picam2 = Picamera2()
-        camera_config = self.picam2.create_video_configuration(
-            main={"size": (IMAGE_WIDTH, IMAGE_HEIGHT)},  # 1080p resolution
-            #main={"size": (4608, 2592)},  # picam3 max resolution
-            controls={"FrameRate": 15}    # Set frame rate to 15 fps for 4K
-        )
-        self.picam2.configure(camera_config)
-        self.picam2.set_controls({"AfMode": 2, "AfRange": 2})
-        self.picam2.start()
-        time.sleep(2)  # Allow camera to initialize
-
-        self.latest_frame = None
-        self.frame_lock = Lock()
-        self.running = True
-        self.recording_thread = Thread(target=self._record_continuously)
-        self.recording_thread.start()
-
-    def _record_continuously(self):
-        while self.running:
-            frame = self.picam2.capture_array()
-            with self.frame_lock:
-                self.latest_frame = frame
-            time.sleep(1 / 15)  # Adjust based on your desired frame rate
-
-    def capture_image(self):
-        with self.frame_lock:
-            if self.latest_frame is not None:
-                return self.latest_frame.copy()
-            else:
-                return None
-
-    def stop(self):
-        self.running = False
-        self.recording_thread.join()
-        self.picam2.stop()
-
 class State(Enum):
     IDLE = 0
     CASEA = 1
@@ -96,81 +66,473 @@ class State(Enum):
     BOOT = 4
 
 class AudioStreamer(object):
-    def __init__(self, base_address='192.168.193.33', port=8000, samplerate=24000, channels=1):
+    # Describe/chat client running on the event loop: streams the multipart upload, then reads the response
+    # in large pieces into a jitter buffer that a callback-mode output stream drains.
+    # Cancelling the task aborts the socket and drops queued audio.
+    def __init__(self, base_address='192.168.193.33', port=8000, samplerate=24000, channels=1,
+                 probe_path='/', probe_timeout=2.0, keepalive_interval=20, read_size=16384, upload_path='/image',
+                 endpoints=None, retry_attempts=3, connect_timeout=2.0, first_byte_timeout=12.0, stall_timeout=3.0,
+                 codecs=("opus", "pcm"), websocket=False, ws_path='/ws', device_id=None,
+                 buffer_ms=2000, prebuffer_ms=200, max_prebuffer_ms=800, time_stretch=True, speed=1.0,
+                 stretch_frame_ms=30, stretch_search_ms=8):
         self.base_address = base_address
         self.port = port
-        self.url = f'http://{base_address}:{port}'
+        # Every request carries the device id and its own request id, a cancel names both
+        self.device_id = device_id or uuid.uuid4().hex
+        self.request_id = None
+        # Requests go to the best of these, the rest are failover targets
+        self.registry = BackendRegistry([f'http://{base_address}:{port}'] + list(endpoints or []))
+        self.endpoint = self.registry.best()    # the one serving (or last serving) a request
+        self.probe_path = probe_path
+        self.upload_path = upload_path
+        self.probe_timeout = probe_timeout
+        self.keepalive_interval = keepalive_interval
+        self.retry_attempts = retry_attempts
+        # Budgets for one interaction: connecting to each endpoint, request to first audio byte
+        # (across failover), and the longest gap between audio chunks once streaming
+        self.connect_timeout = connect_timeout
+        self.first_byte_timeout = first_byte_timeout
+        self.stall_timeout = stall_timeout
+        self.deadline_counters = {"connect": 0, "first_byte": 0, "stall": 0, "unreachable": 0, "http_error": 0}
+        self.read_size = read_size
         self.samplerate = samplerate
         self.channels = channels
+        # Response codecs offered to the server, best first. Only those this device can decode
+        self.codecs = available_codecs(codecs)
+        self.accept = accept_header(self.codecs)
+        # Persistent WebSocket to the best endpoint when enabled, HTTP whenever it is down
+        self.websocket = websocket
+        self.ws_path = ws_path
+        self.channel = None
+        self.transport = None   # what the last request went over, http, websocket or cache
+        self.last_answer = None # int16 audio of the last answer played to the end, for the response cache
+        self.jitter = JitterBuffer(samplerate, channels, capacity_ms=buffer_ms, prebuffer_ms=prebuffer_ms,
+                                   max_prebuffer_ms=max_prebuffer_ms)
+        # Playback speed without a pitch change, in the device callback after the jitter buffer (mono only)
+        self.stretcher = None
+        if time_stretch and channels == 1:
+            self.stretcher = TimeStretcher(self.jitter.callback, samplerate, speed,
+                                           frame_ms=stretch_frame_ms, search_ms=stretch_search_ms)
         self.stream = None
-        self.response = None
         self.starttime = None
         self.call = False
+        self.busy = False
+        self.pending = set()    # background cancels
+
+        # Long-lived pools: one for requests, one kept free so a cancel never waits for a socket.
+        # Sessions are created on first use, inside the running loop
+        self.counters = ConnectionCounters()
+        self.cancel_counters = ConnectionCounters()
+        self.session = None
+        self.cancel_session = None
+        self.bandwidth = None   # BandwidthEstimator, set by QueuedMessageHandler when enabled
         self.waiting_sound, self.file_samplerate = sf.read('/home/ver/cr2/lib_client/waiting.wav')
         self.no_internet_sound, self.file_samplerate = sf.read('/home/ver/cr2/lib_client/internot.wav')
-    
-    def play_loop(self, no_loop_event, sound):
-        time.sleep(2)
-        while not no_loop_event.is_set():
+
+    def open_sessions(self):
+        if self.session is None:
+            # Idle sockets outlive the keep-alive interval, so the probes keep them open
+            keepalive_timeout = self.keepalive_interval * 2
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=2, keepalive_timeout=keepalive_timeout),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout),
+                trace_configs=[counting_trace(self.counters)])
+            self.cancel_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=1, keepalive_timeout=keepalive_timeout),
+                timeout=aiohttp.ClientTimeout(total=self.probe_timeout),
+                trace_configs=[counting_trace(self.cancel_counters)])
+
+    async def close(self):
+        if self.channel is not None:
+            await self.channel.close()
+        for session in (self.session, self.cancel_session):
+            if session is not None:
+                await session.close()
+
+    async def play_loop(self, sound):
+        await asyncio.sleep(2)
+        while True:
             sd.play(sound, self.file_samplerate)
-            time.sleep(2)
-    
-    def run_audio_stream(self, stop_event, image_path, text, timer=False):
-        # Flag to print request to stream time handling
-        if timer is True:
-            self.starttime = time.time()
-            self.call = True
-        
-        # Initialise sounddevice stream
+            await asyncio.sleep(2)
+
+    async def probe(self, session, counters, endpoint):
+        # Any HTTP answer counts for health, the point is the round trip on the pooled connection.
+        # Returns the round trip in seconds, None if the endpoint did not answer
+        start = time.monotonic()
+        try:
+            timeout = aiohttp.ClientTimeout(total=self.probe_timeout)
+            async with session.head(endpoint.url + self.probe_path, timeout=timeout) as response:
+                pooled = keeps_alive(response)
+            if pooled != endpoint.pooled:
+                endpoint.pooled = pooled
+                if not pooled:
+                    print(f"Keep-alive probe to {endpoint.url}: HEAD {self.probe_path} is answered without Content-Length "
+                          f"or with Connection: close, so the socket is not kept warm and requests connect anew")
+            counters.add("probe_ok")
+            return time.monotonic() - start
+        except Exception as e:
+            counters.add("probe_failed")
+            print(f"Keep-alive probe to {endpoint.url} failed: {e}")
+            return None
+
+    async def acquire_connection(self):
+        # Make sure a connected socket to the best endpoint sits in the request pool ahead of the upload
+        self.open_sessions()
+        endpoint = self.registry.best()
+        if time.monotonic() - endpoint.last_ok < self.keepalive_interval:
+            return True     # a recent probe or request left one there
+        rtt = await self.probe(self.session, self.counters, endpoint)
+        self.registry.record_probe(endpoint, rtt)
+        return rtt is not None
+
+    async def keep_warm(self):
+        # Health and round-trip probe of every endpoint, doubling as the keep-alive for their sockets.
+        # The cancel pool only needs a warm socket to the endpoint requests currently go to
+        self.open_sessions()
+
+        async def check(endpoint):
+            self.registry.record_probe(endpoint, await self.probe(self.session, self.counters, endpoint))
+
+        # While busy the serving endpoint's connection is in use, it is warm anyway
+        await asyncio.gather(*(check(endpoint) for endpoint in self.registry.endpoints
+                               if not (self.busy and endpoint is self.endpoint)))
+        await self.probe(self.cancel_session, self.cancel_counters, self.registry.best())
+        await self.ensure_channel()
+
+    async def ensure_channel(self):
+        # (Re)connects the channel to the best endpoint, otherwise checks it with a heartbeat
+        if not self.websocket:
+            return
+        if self.busy and self.transport == "websocket" and self.channel is not None and self.channel.connected:
+            return  # it carries the answer playing now: audio is flowing, any switch waits for the next round
+        url = self.registry.best().url.replace('http', 'ws', 1) + self.ws_path
+        if self.channel is not None and self.channel.connected and self.channel.url == url:
+            if await self.channel.heartbeat(self.probe_timeout) is not None:
+                return
+            print(f"WebSocket heartbeat to {url} timed out")
+        if self.channel is not None:
+            await self.channel.close()
+        self.channel = BackendChannel(url, connect_timeout=self.connect_timeout, device_id=self.device_id)
+        try:
+            await self.channel.connect()
+            print(f"WebSocket channel open to {url}")
+        except Exception as e:
+            print(f"WebSocket channel to {url} unavailable, using HTTP: {e!r}")
+
+    async def cancel(self, request_id=None):
+        # Stops exactly one request (the current one by default), whatever else the backend is serving
+        if self.transport == "websocket":
+            return  # the cancel message went out on the channel when the answer was closed
+        if self.transport == "cache":
+            return  # replayed locally, nothing running on the backend
+        self.open_sessions()
+        headers = request_headers(self.device_id, request_id or self.request_id)
+        try:
+            async with self.cancel_session.post(self.endpoint.url + '/cancel', headers=headers):
+                pass
+        except Exception as e:
+            print(f"Error: {e}")
+
+    async def upload_image(self, image, timings=None):
+        # Sends the image ahead of the question to the best endpoint. Returns the handle
+        # (endpoint, image_id), or None so the image goes with the question instead
+        self.open_sessions()
+        request_id = self.new_request_id(timings)
+        if self.channel is not None and self.channel.connected:
+            try:
+                image_id, body = await asyncio.wait_for(self.channel.send_image(image, request_id), self.first_byte_timeout)
+                self.record_upload(body, timings)
+                if timings is not None:
+                    timings["uploaded"] = time.monotonic()
+                return self.channel, image_id
+            except (ChannelError, asyncio.TimeoutError, ConnectionError) as e:
+                print(f"WebSocket image upload failed, trying HTTP: {e!r}")
+        endpoint = self.registry.best()
+        try:
+            image_id, body = await asyncio.wait_for(
+                post_image(self.session, endpoint.url + self.upload_path, image,
+                           request_headers(self.device_id, request_id)), self.first_byte_timeout)
+        except Exception as e:
+            print(f"Image upload failed, the question will carry the image: {e}")
+            return None
+        self.record_upload(body, timings)
+        if timings is not None:
+            timings["uploaded"] = time.monotonic()
+        return endpoint, image_id
+
+    def new_request_id(self, timings=None):
+        # One id per interaction: set at the button press, shared by a two-phase upload and its question
+        if timings is not None:
+            timings.setdefault("request_id", uuid.uuid4().hex)
+            return timings["request_id"]
+        return uuid.uuid4().hex
+
+    async def send_to(self, endpoint, image, text, image_handle=None, timings=None):
+        ids = request_headers(self.device_id, self.request_id)
+        if image_handle is not None and image_handle[0] is endpoint:
+            body, headers = multipart_body([('text', text), ('image_id', image_handle[1])])
+            headers['Accept'] = self.accept
+            headers.update(ids)
+            response = await self.session.get(endpoint.url, data=body, headers=headers)
+            if response.status != 410:
+                return response
+            response.release()
+            print("Image handle expired, sending the image with the question")
+        body, headers = multipart_body([('text', text), ('file', image)])
+        headers['Accept'] = self.accept
+        headers.update(ids)
+        response = await self.session.get(endpoint.url, data=body, headers=headers)
+        if 200 <= response.status < 300:
+            # Answer headers come once the server has read the whole request
+            body.acknowledged(server_seconds(response.headers.get(SERVER_TIME_HEADER)))
+            self.record_upload(body, timings)
+        return response
+
+    async def send_request(self, image, text, image_handle=None, timings=None, deadline=None):
+        # Endpoints are tried best first until one answers. An unreachable one costs at most
+        # connect_timeout, and the whole attempt sequence stays within the first-byte deadline
+        reason = "first_byte"
+        for endpoint in self.registry.ranked()[:self.retry_attempts]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                reason = "first_byte"
+                break
+            start = time.monotonic()
+            try:
+                response = await asyncio.wait_for(
+                    self.send_to(endpoint, image, text, image_handle, timings), remaining)
+            except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                print(f"Backend {endpoint.url} failed ({e!r}), trying the next one")
+                self.registry.record_failure(endpoint)
+                if isinstance(e, aiohttp.ServerTimeoutError):
+                    reason = "connect"
+                elif isinstance(e, asyncio.TimeoutError):
+                    reason = "first_byte"
+                else:
+                    reason = "unreachable"
+                continue
+            if not 200 <= response.status < 300:
+                # A backend or proxy error page is not audio: try the next endpoint
+                print(f"Backend {endpoint.url} answered HTTP {response.status}, trying the next one")
+                response.release()
+                self.registry.record_failure(endpoint)
+                reason = "http_error"
+                continue
+            self.registry.record_request(endpoint, time.monotonic() - start)
+            self.endpoint = endpoint
+            if timings is not None:
+                timings["endpoint"] = endpoint.url
+            return response
+        raise DeadlineExceeded(reason)
+
+    async def open_answer(self, image, text, image_handle=None, timings=None, deadline=None):
+        # Over the channel when it is up, no per-request handshake; HTTP otherwise or if it fails
+        channel = self.channel
+        if channel is not None and channel.connected:
+            image_id = image_handle[1] if image_handle is not None and image_handle[0] is channel else None
+            try:
+                answer, body = await asyncio.wait_for(
+                    channel.request(text, image, image_id, self.accept.split(', '), self.request_id),
+                    deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                raise DeadlineExceeded("first_byte")
+            except (ChannelError, ConnectionError) as e:
+                print(f"WebSocket request failed, falling back to HTTP: {e!r}")
+            else:
+                if body is not None:
+                    self.record_upload(body, timings)
+                self.transport = "websocket"
+                if timings is not None:
+                    timings["transport"] = "websocket"
+                    timings["endpoint"] = channel.url
+                return answer
+        self.transport = "http"
+        if timings is not None:
+            timings["transport"] = "http"
+        return HttpAnswer(await self.send_request(image, text, image_handle, timings, deadline))
+
+    async def read_chunk(self, answer, deadline=None):
+        # Up to the first byte the first-byte deadline applies, after it each read gets the stall budget.
+        # Time spent waiting for room in the output device is not counted
+        if deadline is None:
+            timeout, reason = self.stall_timeout, "stall"
+        else:
+            timeout, reason = deadline - time.monotonic(), "first_byte"
+        try:
+            return await asyncio.wait_for(answer.read(self.read_size), max(timeout, 0))
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(reason)
+
+    def record_upload(self, body, timings):
+        seconds = body.upload_seconds()
+        if self.bandwidth is None or seconds is None:
+            return
+        rung = timings.get("rung") if timings is not None else None
+        record = self.bandwidth.record_upload(rung, body.len, seconds)
+        if timings is not None:
+            timings["upload"] = record
+        print(f"[Upload] {record}")
+
+    def open_output(self):
+        # Callback-mode stream fed from the jitter buffer, int16 end to end
+        self.jitter.reset()
+        callback = self.jitter.callback
+        if self.stretcher is not None:
+            self.stretcher.reset()
+            callback = self.stretcher.callback
         self.stream = sd.OutputStream(
             samplerate=self.samplerate,
             channels=self.channels,
-            dtype='float32',
+            dtype='int16',
+            callback=callback,
         )
+
+    def set_speed(self, speed):
+        # Takes effect within one device callback, also in the middle of an answer
+        if self.stretcher is not None:
+            self.stretcher.set_speed(speed)
+
+    async def write_audio(self, data):
+        # data is int16 audio, bytes-like. Backpressure: what does not fit in the jitter buffer waits for
+        # playback to make room, the socket is not read meanwhile so TCP flow control slows the server down
+        data = memoryview(data).cast('B')
+        while True:
+            data = data[self.jitter.write(data):]
+            if not len(data):
+                return
+            samples = len(data) // self.jitter.frame_bytes
+            await asyncio.sleep(min(max(samples, 256), self.jitter.capacity // 4) / self.samplerate)
+
+    async def drain_audio(self, timings=None):
+        # Lets the queued tail play out, bounded in case the device stopped calling back
+        self.jitter.finish()
+        limit = time.monotonic() + self.jitter.fill / self.samplerate / TimeStretcher.MIN_SPEED + 1.0
+        try:
+            while not self.jitter.drained.is_set() and time.monotonic() < limit:
+                await asyncio.sleep(0.02)
+            if self.stretcher is not None:
+                await asyncio.sleep(self.stretcher.latency)     # what is still in the stretcher
+        except asyncio.CancelledError:
+            self.jitter.clear()
+            self.stream.abort()
+            raise
+        finally:
+            report = self.jitter.report()
+            if timings is not None:
+                timings["jitter"] = report
+            print(f"[Jitter] {report}")
+
+    async def run_audio_stream(self, image, text, timer=False, timings=None, image_handle=None):
+        self.open_sessions()
+        self.busy = True
+        self.request_id = self.new_request_id(timings)
+        self.last_answer = None
+        received = []
+        # Flag to print request to stream time handling
+        if timer is True:
+            self.starttime = time.time()
+            self.call = True
         
-        files = {'file': open(image_path, 'rb')}
-        data = {'text': text}
+        self.open_output()
         
-        no_loop_event = threading.Event()
-        audioL = threading.Thread(target=self.play_loop, args=(no_loop_event, self.waiting_sound), daemon=True)
-        audioL.start()
+        waiting = asyncio.create_task(self.play_loop(self.waiting_sound))
+        deadline = time.monotonic() + self.first_byte_timeout
         try:
-            self.response = requests.get(self.url, files=files, data=data, stream=True)
+            if timings is not None:
+                timings["request"] = time.monotonic()
+            connects = self.counters.snapshot()["connect"]
+            async with await self.open_answer(image, text, image_handle, timings, deadline) as answer:
+                if timings is not None:
+                    timings["connection"] = "connect" if self.counters.snapshot()["connect"] > connects else "reuse"
+                # Whatever the server picked from Accept, raw PCM when it does not say (older backends)
+                decoder = decoder_for(answer.content_type, self.samplerate, self.channels)
+                if timings is not None:
+                    timings["codec"] = type(decoder).__name__
 
-            no_loop_event.set()
-            audioL.join()
+                with self.stream:
+                    print("Audio Stream Commenced")
+                    try:
+                        while True:
+                            chunk = await self.read_chunk(answer, deadline)
+                            if not chunk:
+                                break
+                            if deadline is not None:    # first audio, the stall budget applies from here
+                                deadline = None
+                                waiting.cancel()
+                            if self.call is True:   # print time on first chunk if enabled
+                                elapsed_time = time.time() - self.starttime
+                                print('[{}] finished in {} ms'.format('Request to Stream', int(elapsed_time * 1_000)))
+                                self.call = False
+                            if timings is not None and "first_audio" not in timings:
+                                timings["first_audio"] = time.monotonic()
 
-            with self.stream:
-                print("Audio Stream Commenced")
-                try:
-                    for chunk in self.response.iter_content(chunk_size=56):
-                        if self.call is True:   # print time on first chunk if enabled
-                            elapsed_time = time.time() - self.starttime
-                            print('[{}] finished in {} ms'.format('Request to Stream', int(elapsed_time * 1_000)))
-                            self.call = False
-                        
-                        if chunk and not stop_event.is_set():  # continuously write to output device
-                            audio_data = np.frombuffer(chunk, dtype=np.int16)
-                            audio_float = audio_data.astype(np.float32) / 32768.0
-                            self.stream.write(audio_float)
-                        else:
-                            print('Cancelled')
-                            break
-                except Exception as e:
-                    print(f"Error: {e}")
-                finally:
-                    self.response.close()
+                            # Raw PCM goes to the jitter buffer as read, split samples are completed there
+                            audio_data = chunk if decoder.passthrough else decoder.decode(chunk)
+                            if len(audio_data):
+                                received.append(audio_data)
+                                await self.write_audio(audio_data)
+                        # Cached only when it arrived whole and was audio (raw PCM included), never an error body
+                        if received and answer.complete and is_audio_type(answer.content_type):
+                            joined = b''.join(received)
+                            self.last_answer = np.frombuffer(joined, dtype=np.int16, count=len(joined) // 2)
+                    except (asyncio.CancelledError, DeadlineExceeded) as e:
+                        print('Cancelled' if isinstance(e, asyncio.CancelledError) else 'Timed out')
+                        answer.close()      # drop the answer rather than draining it
+                        self.jitter.clear() # and the audio already queued for the device
+                        self.stream.abort()
+                        raise
+                    except Exception as e:
+                        print(f"Error: {e}")
+                    await self.drain_audio(timings)
+
+        except DeadlineExceeded as e:
+            # Out of budget: fall back to the local cue at once, and let the server drop the work
+            self.deadline_counters[e.reason] += 1
+            if timings is not None:
+                timings["deadline"] = e.reason
+            print(f"Error: {e}, deadlines {self.deadline_counters}")
+            waiting.cancel()
+            spawn(self.pending, self.cancel(), "Cancel")
+            sd.play(self.no_internet_sound, self.file_samplerate)
+            await asyncio.sleep(len(self.no_internet_sound) / self.file_samplerate)
 
         except Exception as e:
             print(f"Error: {e}")
-            no_loop_event.set()
-            audioL.join()
+            waiting.cancel()
             sd.play(self.no_internet_sound, self.file_samplerate)
-            sd.wait()
+            await asyncio.sleep(len(self.no_internet_sound) / self.file_samplerate)
 
         finally: # Tidy up stream and connection
+            waiting.cancel()
             print("Finished Audio Stream")
             self.stream.close()
+            self.busy = False
+            print(f"[Connections] {self.transport} {self.endpoint.url}: request {self.counters.snapshot()}, cancel {self.cancel_counters.snapshot()}")
+
+    async def play_cached(self, samples, text=None, timer=False, timings=None, image_handle=None):
+        # Replays an answer from the response cache, same call shape as run_audio_stream so the
+        # press handling and button cancel are shared
+        self.busy = True
+        self.transport = "cache"
+        if timings is not None:
+            timings["transport"] = "cache"
+        self.open_output()
+        try:
+            with self.stream:
+                if timings is not None:
+                    timings["first_audio"] = time.monotonic()
+                for start in range(0, len(samples), self.read_size):
+                    await self.write_audio(samples[start:start + self.read_size])
+                await self.drain_audio(timings)
+        except asyncio.CancelledError:
+            print('Cancelled')
+            self.jitter.clear()
+            self.stream.abort()
+            raise
+        finally:
+            self.stream.close()
+            self.busy = False
+            print("Finished cached answer")
 
 class SoundPlayer:
     def __init__(self):
@@ -224,11 +586,11 @@ class QueuedMessageHandler:
         self.done_fd = os.eventfd(0)
         self.mq = deque()
         self.state = State.IDLE
-        self.ASC = AudioStreamer()
-        self.base_address = '192.168.193.33'
-        self.port = 8000
-        self.cancel_url = f'http://{self.base_address}:{self.port}/cancel'
         self.running = True
+        self.last_edge_time = time.monotonic()
+        # Worker threads for the press pipeline, separate from the default executor the GPIO reader sits in
+        self.press_executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix='press')
+        self.pending = set()    # press work nobody awaits: cue playback, connecting ahead
 
         self.sound_player = SoundPlayer()
         self.load_sounds()
@@ -238,6 +600,36 @@ class QueuedMessageHandler:
         self.config_lock = Lock()
         self.update_describe_prompt()
 
+        network_config = self.config.get('network', {})
+        deadline_config = self.config.get('deadlines', {})
+        audio_config = self.config.get('audio', {})
+        self.keepalive_interval = network_config.get('keepalive_interval', 20)
+        self.ASC = AudioStreamer(
+            base_address=network_config.get('host', '192.168.193.33'),
+            port=network_config.get('port', 8000),
+            endpoints=network_config.get('endpoints', []),
+            retry_attempts=network_config.get('retry_attempts', 3),
+            connect_timeout=deadline_config.get('connect_ms', 2000) / 1000,
+            first_byte_timeout=deadline_config.get('first_byte_ms', 12000) / 1000,
+            stall_timeout=deadline_config.get('stall_ms', 3000) / 1000,
+            codecs=audio_config.get('codecs', ['opus', 'pcm']),
+            websocket=network_config.get('websocket', True),
+            ws_path=network_config.get('ws_path', '/ws'),
+            device_id=self.load_device_id(network_config.get('device_id', '')),
+            probe_path=network_config.get('probe_path', '/'),
+            probe_timeout=network_config.get('probe_timeout', 2.0),
+            keepalive_interval=self.keepalive_interval,
+            read_size=network_config.get('read_size', 16384),
+            upload_path=network_config.get('upload_path', '/image'),
+            buffer_ms=audio_config.get('buffer_ms', 2000),
+            prebuffer_ms=audio_config.get('prebuffer_ms', 200),
+            max_prebuffer_ms=audio_config.get('max_prebuffer_ms', 800),
+            time_stretch=audio_config.get('time_stretch', True),
+            stretch_frame_ms=audio_config.get('stretch_frame_ms', 30),
+            stretch_search_ms=audio_config.get('stretch_search_ms', 8))
+        # Chat mode uploads the image while the user is still speaking
+        self.two_phase_chat = network_config.get('two_phase_chat', True)
+
         # Initialise Vosk model for speech recognition
         self.model = Model(lang="en-us")
         self.device_info = sd.query_devices(None, "input")
@@ -245,7 +637,92 @@ class QueuedMessageHandler:
         self.rec = KaldiRecognizer(self.model, self.samplerate)
         self.q = queue.Queue()
         
-        self.camera_controller = CameraController()
+        camera_config = self.config.get('camera', {})
+        self.camera_controller = CameraController(
+            ring_slots=camera_config.get('ring_slots', 4),
+            focus_window=camera_config.get('focus_window', 1.0),
+            focus_downscale=camera_config.get('focus_downscale', 8),
+            select_sharpest=camera_config.get('select_sharpest', True),
+            mode=camera_config.get('mode', 'video'),
+            preview_size=camera_config.get('preview_size', [320, 276]),
+            preview_fps=camera_config.get('preview_fps', 10),
+            active_fps=camera_config.get('active_fps', 15),
+            idle_fps=camera_config.get('idle_fps', 2),
+            idle_after=camera_config.get('idle_after', 10.0),
+            backend=camera_config.get('backend', 'picamera2'),
+            capture_path=camera_config.get('capture_path', 'request'),
+            af_wait=camera_config.get('af_wait', True),
+            af_deadline_ms=camera_config.get('af_deadline_ms', 300))
+        self.camera_stats_interval = camera_config.get('stats_interval', 60)
+
+        gate_config = self.config.get('quality_gate', {})
+        self.quality_gate = FrameQualityGate(
+            enabled=gate_config.get('enabled', True),
+            downscale=gate_config.get('downscale', 16),
+            covered_mean=gate_config.get('covered_mean', 15),
+            covered_std=gate_config.get('covered_std', 6),
+            dark_mean=gate_config.get('dark_mean', 30),
+            bright_mean=gate_config.get('bright_mean', 235),
+            clip_fraction=gate_config.get('clip_fraction', 0.85),
+            blank_std=gate_config.get('blank_std', 4))
+
+        upload_config = self.config.get('upload', {})
+        self.encoder = ImageEncoder(
+            format=upload_config.get('format', 'jpeg'),
+            quality=upload_config.get('quality', 85),
+            max_dimension=upload_config.get('max_dimension', 1280))
+
+        # Sampled copies of what was uploaded, written off the hot path
+        debug_config = self.config.get('debug', {})
+        self.debug_writer = None
+        if debug_config.get('enabled', True):
+            self.debug_writer = DebugWriter(
+                directory=debug_config.get('directory', 'debug_captures'),
+                sample_rate=debug_config.get('sample_rate', 0.2),
+                max_queue=debug_config.get('max_queue', 4),
+                max_bytes=int(debug_config.get('max_disk_mb', 200) * 1_000_000))
+        warp_dimension = upload_config.get('max_dimension', 1280)
+
+        bandwidth_config = self.config.get('bandwidth', {})
+        if bandwidth_config.get('enabled', True):
+            self.ASC.bandwidth = BandwidthEstimator(
+                ladder=bandwidth_config.get('ladder', [[1600, 85], [1280, 80], [1024, 75], [800, 70], [640, 60]]),
+                target_ms=bandwidth_config.get('target_ms', 300),
+                alpha=bandwidth_config.get('alpha', 0.3),
+                start_rung=bandwidth_config.get('start_rung', 1))
+            # Warp to the top rung, the encoder shrinks further for lower ones
+            warp_dimension = max(rung[0] for rung in self.ASC.bandwidth.ladder)
+
+        # Built once here for the camera resolution, applied per press as a single warp
+        self.warp = RotateCropWarp(IMAGE_WIDTH, IMAGE_HEIGHT,
+            angle=upload_config.get('rotation', 30),
+            crop=upload_config.get('crop', 'inscribed'),
+            max_dimension=warp_dimension)
+
+        # Read mode (Device Mode in the web UI settings) crops describe captures to the text
+        read_config = self.config.get('read_mode', {})
+        self.read_mode_enabled = read_config.get('enabled', True)
+        self.device_settings_path = read_config.get('settings_path', 'custom_setting.json')
+        self.text_cropper = TextRegionCropper(
+            detect_width=read_config.get('detect_width', 800),
+            margin=read_config.get('margin', 0.03),
+            grayscale=read_config.get('grayscale', True),
+            clip_limit=read_config.get('clip_limit', 2.0))
+        self.read_mode = self.load_read_mode()
+        self.playback_speed = self.load_playback_speed()
+        self.ASC.set_speed(self.playback_speed)
+
+        # Answers replayed on device when the same scene is asked about again
+        cache_config = self.config.get('cache', {})
+        self.response_cache = None
+        if cache_config.get('enabled', True):
+            self.response_cache = ResponseCache(
+                max_entries=cache_config.get('max_entries', 64),
+                memory_bytes=int(cache_config.get('memory_mb', 16) * 1_000_000),
+                disk_bytes=int(cache_config.get('disk_mb', 100) * 1_000_000),
+                directory=cache_config.get('directory', 'response_cache'),
+                ttl=cache_config.get('ttl_s', 600),
+                max_distance=cache_config.get('max_distance', 6))
     
     def load_config(self):
         try:
@@ -260,12 +737,46 @@ class QueuedMessageHandler:
                 }
             }
 
+    def load_device_id(self, configured='', path='device_id.txt'):
+        # Configured id, else one generated on first boot and kept so the backend sees a stable device
+        if configured:
+            return configured
+        try:
+            with open(path, 'r') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            device_id = uuid.uuid4().hex
+            with open(path, 'w') as f:
+                f.write(device_id)
+            return device_id
+
     def update_describe_prompt(self):
         with self.config_lock:
             input_prompt = self.config['prompt']['input_text']
             max_length = self.config['prompt']['max_length']
             self.describe_prompt = f'Describe the content in {max_length} words or less. {input_prompt}'
 
+    def load_read_mode(self):
+        # The web UI stores the mode as a prompt, e.g. "Read any important text in this image..."
+        if not self.read_mode_enabled:
+            return False
+        try:
+            with open(self.device_settings_path, 'r') as f:
+                mode = json.load(f).get('Device Mode', {}).get('value', '')
+            return mode.strip().lower().startswith('read')
+        except Exception as e:
+            print(f"Error loading device settings: {e}")
+            return False
+
+    def load_playback_speed(self):
+        # "Playback Speed" from the web UI settings, 1.0 when unset or unreadable
+        try:
+            with open(self.device_settings_path, 'r') as f:
+                return float(json.load(f).get('Playback Speed', {}).get('value', 1.0))
+        except Exception as e:
+            print(f"Error loading device settings: {e}")
+            return 1.0
+
     async def check_config_updates(self):
         while self.running:
             try:
@@ -275,6 +786,15 @@ class QueuedMessageHandler:
                         self.config = new_config
                     self.update_describe_prompt()
                     print("Configuration updated")
+                read_mode = self.load_read_mode()
+                if read_mode != self.read_mode:
+                    self.read_mode = read_mode
+                    print(f"Read mode {'on' if read_mode else 'off'}")
+                playback_speed = self.load_playback_speed()
+                if playback_speed != self.playback_speed:
+                    self.playback_speed = playback_speed
+                    self.ASC.set_speed(playback_speed)
+                    print(f"Playback speed {playback_speed}")
             except Exception as e:
                 print(f"Error checking configuration updates: {e}")
             await asyncio.sleep(5)  # Check every 5 seconds
@@ -292,6 +812,8 @@ class QueuedMessageHandler:
             self.sound_player.load_sound(name, file_path)
 
         self.sound_player.sounds["ping"] = {"data": self.generate_ping(), "sample_rate": 44100}
+        # Low tone for a frame rejected by the quality gate (too dark, covered...)
+        self.sound_player.sounds["bad_frame"] = {"data": self.generate_ping(400, 520, 0.3), "sample_rate": 44100}
         # self.sound_player.load_sound("ping", )
 
     def generate_ping(self, freq1=1500, freq2=1800, duration=0.15, sample_rate=44100):
@@ -336,6 +858,9 @@ class QueuedMessageHandler:
                 events = await asyncio.get_event_loop().run_in_executor(None, request.read_edge_events)
                 for event in events:
                     self.mq.append([event.line_offset, self.edge_type_str(event)])
+                if events:
+                    self.last_edge_time = time.monotonic()
+                    self.camera_controller.wake()
                 
                 # Check if we need to stop
                 if await self.is_done(done_fd):
@@ -361,12 +886,14 @@ class QueuedMessageHandler:
                     return ting.get("text", "") # Format detection
 
     async def audio_threader(self, target_function, input_cancel = False,
-        target_sound = None, image_path = None, prompt = None, que = None):
+        target_sound = None, image = None, prompt = None, que = None, timings = None, image_handle = None):
+        if prompt is not None:
+            await self.stream_response(target_function, image, prompt, timings, image_handle)
+            return
+
         stop_event = threading.Event()
 
-        if prompt is not None:
-            arg_list = (stop_event, image_path, prompt)
-        elif input_cancel:
+        if input_cancel:
             arg_list = (que, stop_event)
         else:
             arg_list = (stop_event, target_sound)
@@ -377,24 +904,14 @@ class QueuedMessageHandler:
             daemon=True
         )
         audio_thread.start()
-        if input_cancel or prompt is not None:
+        if input_cancel:
             await asyncio.sleep(1)
             self.mq.clear()
         while audio_thread.is_alive():
             await asyncio.sleep(0.1)
             if self.mq.count([GPIO_A, FALLING_EDGE]) != 0 or self.mq.count([GPIO_B, FALLING_EDGE]) != 0:
                 stop_event.set()
-                if prompt is not None:
-                    try:
-                        response = requests.post(self.cancel_url)
-                    except Exception as e:
-                        print(f"Error: {e}")
-                    await asyncio.sleep(0.1)  # Give a short time for the audio stream to stop
-                    await self.sound_player.play_sound_async('cancel')
-                    audio_thread.join()
-                    self.mq.clear()
-                    break
-                elif input_cancel:
+                if input_cancel:
                     await self.sound_player.play_sound_async('cancel')
                 else:
                     await asyncio.sleep(0.1)
@@ -405,24 +922,179 @@ class QueuedMessageHandler:
             pass
         self.mq.clear()
 
-    def rotate_and_save(self, pre_image):
-        rgb = cv2.cvtColor(image_array, cv2.COLOR_BGR2RGB)
-        image_path = 'best_image_q_pre.png'
-        cv2.imwrite(image_path, rgb)
-        rgb = Image.fromarray(rgb)
-        post_image = rgb.rotate(30,expand=True)
-        post_image = np.array(post_image)
-        #rotate_and_save
-        #crop
-        image_path = 'best_image_q.png'
-        cv2.imwrite(image_path, post_image)
+    async def stream_response(self, target_function, image, prompt, timings=None, image_handle=None):
+        # The request runs as a task on this loop, a button press cancels it: the socket is
+        # aborted and queued audio dropped on the spot, then the server is told over the cancel pool
+        task = asyncio.create_task(target_function(image, prompt, False, timings, image_handle))
+        await asyncio.sleep(1)
+        self.mq.clear()
+        while not task.done():
+            await asyncio.sleep(0.02)
+            if self.mq.count([GPIO_A, FALLING_EDGE]) != 0 or self.mq.count([GPIO_B, FALLING_EDGE]) != 0:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                await self.ASC.cancel()
+                await self.sound_player.play_sound_async('cancel')
+                break
+        self.mq.clear()
+
+    def rotate_and_encode(self, pre_image, timings=None, read_mode=False):
+        # Rotate, crop and downscale in one warp, then swap channels on the small result only.
+        # Camera buffers are RGB(X) in memory, the swap gives OpenCV's BGR order for encoding
+        start = time.perf_counter()
+        warped = self.warp.apply(pre_image)
+        post_image = cv2.cvtColor(warped, cv2.COLOR_RGBA2BGR if warped.shape[2] == 4 else cv2.COLOR_RGB2BGR)
+        print('[{}] finished in {} ms'.format('Warp', int((time.perf_counter() - start) * 1000)))
+
+        if read_mode:
+            full_size = post_image.shape[:2]
+            post_image = self.text_cropper.apply(post_image)
+            print('[{}] finished in {} ms, {} lines, skew {:.1f}, {} -> {}'.format(
+                'Text Crop', int(self.text_cropper.last_ms), self.text_cropper.last_lines,
+                self.text_cropper.last_skew, full_size, post_image.shape[:2]))
 
-        return post_image
+        if self.response_cache is not None and timings is not None:
+            timings["phash"] = perceptual_hash(post_image)
+
+        if self.ASC.bandwidth is not None:
+            # Rung sized for the upload throughput seen on previous requests
+            rung = self.ASC.bandwidth.choose()
+            max_dimension, quality = self.ASC.bandwidth.ladder[rung]
+            if timings is not None:
+                timings["rung"] = rung
+            payload = self.encoder.encode(post_image, quality=quality, max_dimension=max_dimension)
+        else:
+            rung = None
+            payload = self.encoder.encode(post_image)
+        print('[{}] finished in {} ms, {} bytes, rung {}'.format(
+            'Encode', int(self.encoder.last_ms), self.encoder.last_bytes, rung))
+        return payload
+
+    async def keep_backend_warm(self):
+        # Connects at boot, then probes so the press path always finds a warm socket
+        while self.running:
+            await self.ASC.keep_warm()
+            await asyncio.sleep(self.keepalive_interval)
+
+    async def report_camera_stats(self):
+        while self.running:
+            await asyncio.sleep(self.camera_stats_interval)
+            print(f"Camera rate by state: {self.camera_controller.rate_report()}")
+            print(f"Preview frame: {self.camera_controller.preview_stats()}")
+            print(f"Backends: {self.ASC.registry.stats()}")
+            print(f"Deadlines exceeded: {self.ASC.deadline_counters}")
+            if self.debug_writer is not None:
+                print(f"Debug writer: {self.debug_writer.stats()}")
+            if self.response_cache is not None:
+                print(f"Response cache: {self.response_cache.stats()}")
+
+    def capture_for_upload(self, timings=None, read_mode=False):
+        # Grab a frame and run the quality gate, returns the encoded upload or None if rejected
+        lease = self.camera_controller.capture_image()
+        if timings is not None:
+            timings["frame"] = time.monotonic()
+        if lease is None:
+            print('No camera frame available')
+            return None
+        try:
+            reason = self.quality_gate.check(lease.array)
+            if reason is not None:
+                print(f'Frame rejected ({reason}) in {self.quality_gate.last_ms:.1f} ms: {self.quality_gate.counters()}')
+                return None
+            image = self.rotate_and_encode(lease.array, timings, read_mode)
+        finally:
+            lease.release()
+        if timings is not None:
+            timings["encoded"] = time.monotonic()
+        return image
+
+    def start_press(self, cue, read_mode=False):
+        # Everything that does not depend on anything else starts at the button edge: cue playback and
+        # frame grab + encode on worker threads, connecting to the backend on the loop.
+        # Returns the per-stage timestamps and the future for the encoded image.
+        loop = asyncio.get_running_loop()
+        timings = {"edge": self.last_edge_time, "request_id": uuid.uuid4().hex}
+
+        def play_cue():
+            timings["cue"] = time.monotonic()
+            self.sound_player.play_sound(cue)
+
+        async def connect():
+            if await self.ASC.acquire_connection():
+                timings["connected"] = time.monotonic()
+
+        spawn(self.pending, loop.run_in_executor(self.press_executor, play_cue), "Cue")
+        spawn(self.pending, connect(), "Connect")
+        image_future = loop.run_in_executor(self.press_executor, self.capture_for_upload, timings, read_mode)
+        return timings, image_future
+
+    def cache_enabled(self, mode, timings):
+        # Modes left out of [cache] modes always ask the backend
+        if self.response_cache is None or "phash" not in timings:
+            return False
+        with self.config_lock:
+            return mode in self.config.get('cache', {}).get('modes', ["describe", "read", "chat"])
+
+    def cached_answer(self, mode, prompt, timings):
+        # Audio of an earlier answer to a near-identical frame and the same prompt, None to ask the backend
+        if not self.cache_enabled(mode, timings):
+            return None
+        samples = self.response_cache.lookup(timings["phash"], mode, prompt, self.ASC.samplerate)
+        print(f"Response cache {'hit' if samples is not None else 'miss'} ({mode}): {self.response_cache.stats()}")
+        return samples
+
+    def remember_answer(self, mode, prompt, timings):
+        # Only answers that played to the end are kept
+        if not self.cache_enabled(mode, timings) or self.ASC.last_answer is None:
+            return
+        self.response_cache.store(timings["phash"], mode, prompt, self.ASC.last_answer, self.ASC.samplerate)
+
+    PRESS_STAGES = ["cue", "connected", "frame", "encoded", "uploaded", "speech", "request", "first_audio"]
+
+    def print_press_timings(self, timings):
+        edge = timings["edge"]
+        print('[Press timeline] ' + ', '.join(
+            f'{stage} {int((timings[stage] - edge) * 1000)} ms' for stage in self.PRESS_STAGES if stage in timings)
+            + f', connection {timings.get("connection")}')
+
+    def save_debug_artifact(self, image, prompt, timings):
+        if self.debug_writer is None:
+            return
+        edge = timings["edge"]
+        metadata = {
+            "state": self.state.name,
+            "request_id": timings.get("request_id"),
+            "prompt": prompt,
+            "read_mode": self.read_mode,
+            "stages_ms": {stage: int((timings[stage] - edge) * 1000) for stage in self.PRESS_STAGES if stage in timings},
+            "rung": timings.get("rung"),
+            "connection": timings.get("connection"),
+            "endpoint": timings.get("endpoint"),
+            "deadline": timings.get("deadline"),
+            "codec": timings.get("codec"),
+            "transport": timings.get("transport"),
+            "jitter": timings.get("jitter"),
+            "speed": self.playback_speed,
+            "upload": timings.get("upload"),
+            "af_wait_ms": self.camera_controller.last_af_wait_ms,
+            "af_locked": self.camera_controller.last_af_locked,
+            "preview": self.camera_controller.preview_stats(),
+            "quality": self.quality_gate.last_stats,
+        }
+        self.debug_writer.submit(image, metadata)
 
     async def state_run(self):
+        last_state = None
         while self.running:
             await asyncio.sleep(0.01)
 
+            if self.state != last_state:    # capture rate follows the state machine
+                self.camera_controller.set_state(self.state.name)
+                last_state = self.state
+
             if self.state == State.IDLE:
                 await asyncio.sleep(0.01)
                 if self.mq.count([GPIO_A, FALLING_EDGE])!=0:
@@ -434,41 +1106,73 @@ class QueuedMessageHandler:
 
             elif self.state == State.CASEA:
                 print('CASE A')
-                image_array = self.camera_controller.capture_image()
-                self.rotate_and_save(image_array)
-                image_path = 'best_image_q.png'
-                asyncio.create_task(self.sound_player.play_sound_async('desc'))
-                
-                
-                await self.audio_threader(self.ASC.run_audio_stream, input_cancel = False,
-                    target_sound = None, image_path = image_path,
-                    prompt = self.describe_prompt)
+                mode = "read" if self.read_mode else "describe"
+                timings, image_future = self.start_press('desc', read_mode=self.read_mode)
+                image = await image_future
+                if image is None:
+                    await self.sound_player.play_sound_async('bad_frame')
+                    self.mq.clear()
+                    self.state = State.IDLE
+                    continue
+
+                cached = self.cached_answer(mode, self.describe_prompt, timings)
+                if cached is not None:
+                    await self.audio_threader(self.ASC.play_cached, image = cached,
+                        prompt = self.describe_prompt, timings = timings)
+                else:
+                    await self.audio_threader(self.ASC.run_audio_stream, input_cancel = False,
+                        target_sound = None, image = image,
+                        prompt = self.describe_prompt, timings = timings)
+                    self.remember_answer(mode, self.describe_prompt, timings)
+                self.print_press_timings(timings)
+                self.save_debug_artifact(image, self.describe_prompt, timings)
 
                 self.state = State.IDLE
             
             elif self.state == State.CASEB:
                 print('CASE B')
-                image_array = self.camera_controller.capture_image()
-                self.rotate_and_save(image_array)
-                image_path = 'best_image_q.png'
-                
-                asyncio.create_task(self.sound_player.play_sound_async('chat'))
+                timings, image_future = self.start_press('chat')
+                image = await image_future
+                if image is None:
+                    await self.sound_player.play_sound_async('bad_frame')
+                    self.mq.clear()
+                    self.state = State.IDLE
+                    continue
+
+                # Speculative first phase: the image goes up while Vosk listens
+                upload_task = None
+                if self.two_phase_chat:
+                    upload_task = asyncio.create_task(self.ASC.upload_image(image, timings))
 
                 result = None
                 que = Queue()
                 
                 await self.audio_threader(target_function = lambda q, arg1: q.put(self.input_speech(arg1)), input_cancel = True,
-                    target_sound = None, image_path = None, prompt = None, que = que)
+                    target_sound = None, image = None, prompt = None, que = que)
 
                 result = que.get()
                 print(result)
 
                 if result != None:
-                    await self.audio_threader(self.ASC.run_audio_stream, input_cancel = False,
-                        target_sound = None, image_path = image_path,
-                        prompt = result)
+                    timings["speech"] = time.monotonic()
+                    cached = self.cached_answer("chat", result, timings)
+                    if cached is not None:
+                        if upload_task is not None:
+                            upload_task.cancel()
+                        await self.audio_threader(self.ASC.play_cached, image = cached,
+                            prompt = result, timings = timings)
+                    else:
+                        image_handle = await upload_task if upload_task is not None else None
+                        await self.audio_threader(self.ASC.run_audio_stream, input_cancel = False,
+                            target_sound = None, image = image,
+                            prompt = result, timings = timings, image_handle = image_handle)
+                        self.remember_answer("chat", result, timings)
+                    self.print_press_timings(timings)
+                    self.save_debug_artifact(image, result, timings)
                     self.state = State.IDLE
                 else:
+                    if upload_task is not None:
+                        upload_task.cancel()
                     await self.sound_player.play_sound_async('cancel')
                     self.mq.clear()
                     self.state = State.IDLE
@@ -477,7 +1181,7 @@ class QueuedMessageHandler:
                 print('Help')
                 await asyncio.create_task(self.sound_player.play_sound_async('helper'))
                 #await self.audio_threader(self.sound_player.play_sound_async, input_cancel = False,
-                #    target_sound = 'helper', image_path = None,
+                #    target_sound = 'helper', image = None,
                 #    prompt = None)
                 self.mq.clear()
                 self.state = State.IDLE
@@ -486,7 +1190,9 @@ class QueuedMessageHandler:
         await asyncio.gather(
             self.async_watch_line_value("/dev/gpiochip4", [GPIO_A, GPIO_B, GPIO_C], self.done_fd),
             self.state_run(),
-            self.check_config_updates())
+            self.check_config_updates(),
+            self.report_camera_stats(),
+            self.keep_backend_warm())
 
     def stop(self):
         self.running = False
@@ -497,6 +1203,8 @@ async def main():
         await qmh.run()
     except asyncio.CancelledError:
         qmh.stop()
+    finally:
+        await qmh.ASC.close()
 
 if __name__ == "__main__":
     try:
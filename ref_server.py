@@ -0,0 +1,291 @@
+'''
+File: ref_server.py
+Created Date: Monday, October 19th 2026, 1:37:12 pm
+
+Project Ver 2024
+'''
+
+### Local stand-in for the describe/chat backend, speaking the same protocol as AudioStreamer:
+###   GET /            multipart text + file (or text + image_id), streams the 24 kHz answer audio back
+###   POST /image      multipart file, answers {"image_id": ...} for a later GET
+###   POST /cancel     stops the request named by X-Device-Id / X-Request-Id (all of a device's with only
+###                    the device id, everything with neither, as older devices send it)
+###   GET /ws          the same over one WebSocket, message protocol in channel.py
+### Answers to an upload carry X-Server-Ms, the time spent after reading the body, so clients can time uploads.
+### The "model" is a fixed think time and the answer a speech-like synthetic signal (or a recorded
+### int16 PCM file), sent as PCM or Opus as negotiated through Accept. Request bodies and answers can be
+### throttled to given uplink/downlink rates, so link-bound changes can be measured on one machine.
+
+import argparse
+import asyncio
+import json
+import time
+import uuid
+
+import numpy as np
+from aiohttp import web
+
+from audio_codec import CODEC_TYPES, OpusEncoder, available_codecs, choose_codec
+from channel import FRAME_ID
+from network import SERVER_TIME_HEADER
+
+
+SAMPLERATE = 24000
+
+
+def synthetic_speech(seconds, seed=0):
+    # Voiced harmonics on a wandering pitch, syllable-rate envelope and a little breath noise.
+    # Closer to what a codec sees from TTS than a pure tone
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(SAMPLERATE * seconds)) / SAMPLERATE
+    f0 = 150 + 40 * np.sin(2 * np.pi * 0.7 * t) + 15 * np.sin(2 * np.pi * 3.1 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / SAMPLERATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t + rng.uniform(0, 1)), 0, None) ** 0.5
+    signal = voiced * envelope + 0.05 * rng.standard_normal(len(t))
+    return (signal / np.abs(signal).max() * 12000).astype(np.int16)
+
+
+class ReferenceServer:
+    def __init__(self, think_ms=800, answer_seconds=3.0, uplink_kbps=0, pace=2.0, image_ttl=120, chunk_ms=20,
+                 downlink_kbps=0, codecs=("opus", "pcm"), opus_bitrate=24000, answer_pcm=None):
+        self.think = think_ms / 1000
+        self.answer_seconds = answer_seconds
+        self.uplink_kbps = uplink_kbps  # 0 reads bodies as fast as they arrive
+        self.downlink_kbps = downlink_kbps
+        self.pace = pace                # answer audio is sent this much faster than real time
+        self.image_ttl = image_ttl
+        self.chunk_samples = SAMPLERATE * chunk_ms // 1000
+        self.images = {}                # image_id -> (bytes, expiry, (device id, request id))
+        self.streams = {}               # (device id, request id) -> task working on that answer
+        self.stats = {"requests": 0, "images": 0, "expired": 0, "cancelled": 0, "bytes_in": 0, "bytes_out": 0,
+                      "channels": 0, "heartbeats": 0, "cancel_targeted": 0, "cancel_bare": 0,
+                      "work_done_s": 0.0, "work_released_s": 0.0}
+
+        if answer_pcm is not None:
+            self.answer = np.fromfile(answer_pcm, dtype=np.int16)
+        else:
+            self.answer = synthetic_speech(answer_seconds)
+        # The answer pre-cut into chunk_ms pieces per codec, so streaming only paces the writes
+        self.codecs = available_codecs(codecs)
+        self.chunks = {"pcm": [self.answer[start:start + self.chunk_samples].tobytes()
+                               for start in range(0, len(self.answer), self.chunk_samples)]}
+        if "opus" in self.codecs:
+            encoder = OpusEncoder(SAMPLERATE, bitrate=opus_bitrate, frame_ms=chunk_ms)
+            self.chunks["opus"] = [encoder.encode(self.answer[start:start + self.chunk_samples])
+                                   for start in range(0, len(self.answer), self.chunk_samples)]
+
+    def app(self):
+        app = web.Application(client_max_size=32 * 1024 * 1024)
+        app.router.add_get('/', self.describe)
+        app.router.add_get('/ws', self.channel)
+        app.router.add_post('/image', self.upload)
+        app.router.add_post('/cancel', self.cancel)
+        app.router.add_get('/stats', self.report)
+        return app
+
+    async def throttle(self, nbytes):
+        if self.uplink_kbps:
+            await asyncio.sleep(nbytes * 8 / (self.uplink_kbps * 1000))
+
+    async def read_form(self, request):
+        form = {}
+        reader = await request.multipart()
+        async for part in reader:
+            data = bytearray()
+            while True:
+                chunk = await part.read_chunk(8192)
+                if not chunk:
+                    break
+                data += chunk
+                self.stats["bytes_in"] += len(chunk)
+                await self.throttle(len(chunk))
+            form[part.name] = bytes(data)
+        return form
+
+    def request_key(self, headers):
+        # Who is asking: older devices send no ids, each of their requests gets a key of its own
+        return headers.get('X-Device-Id'), headers.get('X-Request-Id') or uuid.uuid4().hex
+
+    def store_image(self, data, key=None):
+        self.expire_images()
+        image_id = uuid.uuid4().hex
+        self.images[image_id] = (data, time.monotonic() + self.image_ttl, key)
+        self.stats["images"] += 1
+        return image_id
+
+    def take_image(self, image_id):
+        # Images are used once. None when unknown or expired
+        self.expire_images()
+        entry = self.images.pop(image_id, None)
+        return None if entry is None else entry[0]
+
+    def expire_images(self):
+        now = time.monotonic()
+        for image_id in [i for i, (_, expiry, _) in self.images.items() if expiry < now]:
+            del self.images[image_id]
+            self.stats["expired"] += 1
+
+    def server_ms(self, received):
+        # Reported with every acknowledgement, so the client times its upload without our own work
+        return round(1000 * (time.monotonic() - received), 1)
+
+    async def upload(self, request):
+        form = await self.read_form(request)
+        received = time.monotonic()
+        if 'file' not in form:
+            return web.Response(status=400, text="no file")
+        image_id = self.store_image(form['file'], self.request_key(request.headers))
+        return web.json_response({"image_id": image_id}, headers={SERVER_TIME_HEADER: str(self.server_ms(received))})
+
+    async def describe(self, request):
+        if request.method == 'HEAD':    # keep-alive probe, the length lets the client keep the connection
+            return web.Response(headers={'Content-Length': '0'})
+        form = await self.read_form(request)
+        received = time.monotonic()
+        self.stats["requests"] += 1
+        if 'file' not in form and self.take_image(form.get('image_id', b'').decode()) is None:
+            return web.Response(status=410, text="unknown or expired image_id")
+
+        codec = choose_codec(request.headers.get('Accept'), self.codecs)
+        response = web.StreamResponse()
+        response.content_type = CODEC_TYPES[codec]
+        response.headers[SERVER_TIME_HEADER] = str(self.server_ms(received))
+        await response.prepare(request)
+        if await self.stream_answer(codec, response.write, self.request_key(request.headers)):
+            await response.write_eof()
+        return response
+
+    async def stream_answer(self, codec, write, key):
+        # Think, then send the answer paced; False if it was cancelled or the client went away.
+        # Work is the think time plus generating the audio at the pace, what a cancel gives back is counted
+        task = asyncio.current_task()
+        self.streams[key] = task
+        chunk_seconds = self.chunk_samples / SAMPLERATE / self.pace
+        remaining = self.think + len(self.chunks[codec]) * chunk_seconds
+        started = time.monotonic()
+        try:
+            await asyncio.sleep(self.think)
+            remaining -= self.think
+            for chunk in self.chunks[codec]:
+                await write(chunk)
+                self.stats["bytes_out"] += len(chunk)
+                delay = chunk_seconds
+                if self.downlink_kbps:
+                    delay = max(delay, len(chunk) * 8 / (self.downlink_kbps * 1000))
+                await asyncio.sleep(delay)
+                remaining -= chunk_seconds
+        except (asyncio.CancelledError, ConnectionResetError):
+            self.stats["cancelled"] += 1
+            self.stats["work_released_s"] += max(remaining, 0)
+            return False
+        finally:
+            self.stats["work_done_s"] += time.monotonic() - started
+            if self.streams.get(key) is task:
+                del self.streams[key]
+        return True
+
+    def release(self, device_id=None, request_id=None):
+        # Stops the matching answers at once and drops images uploaded for them
+        def matches(key):
+            return (device_id is None or key[0] == device_id) and (request_id is None or key[1] == request_id)
+        for key in [key for key in self.streams if matches(key)]:
+            self.streams.pop(key).cancel()
+        for image_id in [i for i, (_, _, key) in self.images.items() if key is not None and matches(key)]:
+            del self.images[image_id]
+
+    async def channel(self, request):
+        ws = web.WebSocketResponse(max_msg_size=1024 * 1024)
+        await ws.prepare(request)
+        self.stats["channels"] += 1
+        device_id = request.headers.get('X-Device-Id')
+        uploads = {}    # image id -> [expected size, received bytes, request key]
+        images = {}     # channel image id -> stored image id
+        answers = {}    # request id -> task
+
+        async def answer(frame_id, codec, key):
+            async def write(chunk):
+                await ws.send_bytes(FRAME_ID.pack(frame_id) + chunk)
+            await ws.send_json({"type": "start", "id": frame_id, "content_type": CODEC_TYPES[codec]})
+            if await self.stream_answer(codec, write, key):
+                await ws.send_json({"type": "end", "id": frame_id})
+            answers.pop(frame_id, None)
+
+        try:
+            async for message in ws:
+                if message.type == web.WSMsgType.BINARY:
+                    (image_id,) = FRAME_ID.unpack_from(message.data)
+                    upload = uploads.get(image_id)
+                    if upload is None:
+                        continue
+                    upload[1] += message.data[FRAME_ID.size:]
+                    self.stats["bytes_in"] += len(message.data) - FRAME_ID.size
+                    await self.throttle(len(message.data))
+                    if len(upload[1]) >= upload[0]:
+                        received = time.monotonic()
+                        _, data, key = uploads.pop(image_id)
+                        images[image_id] = self.store_image(bytes(data), key)
+                        await ws.send_json({"type": "image_ok", "id": image_id, "server_ms": self.server_ms(received)})
+                    continue
+                if message.type != web.WSMsgType.TEXT:
+                    continue
+                data = json.loads(message.data)
+                kind = data.get("type")
+                if kind == "heartbeat":
+                    self.stats["heartbeats"] += 1
+                    await ws.send_json(data)
+                elif kind == "image":
+                    uploads[data["id"]] = [data["size"], bytearray(), (device_id, data.get("request_id"))]
+                elif kind == "request":
+                    self.stats["requests"] += 1
+                    if self.take_image(images.pop(data.get("image"), None)) is None:
+                        await ws.send_json({"type": "error", "id": data["id"], "status": 410,
+                                            "message": "unknown or expired image"})
+                        continue
+                    codec = choose_codec(', '.join(data.get("accept", [])), self.codecs)
+                    key = (device_id, data.get("request_id") or uuid.uuid4().hex)
+                    answers[data["id"]] = asyncio.create_task(answer(data["id"], codec, key))
+                elif kind == "cancel":
+                    self.stats["cancel_targeted"] += 1
+                    task = answers.pop(data.get("id"), None)
+                    if task is not None:
+                        task.cancel()
+        finally:
+            for task in answers.values():
+                task.cancel()
+        return ws
+
+    async def cancel(self, request):
+        device_id = request.headers.get('X-Device-Id')
+        request_id = request.headers.get('X-Request-Id')
+        self.stats["cancel_targeted" if device_id or request_id else "cancel_bare"] += 1
+        self.release(device_id, request_id)
+        return web.Response(text="cancelled")
+
+    async def report(self, request):
+        return web.json_response(dict(self.stats, images_held=len(self.images), streams=len(self.streams)))
+
+
+async def start(server, host='127.0.0.1', port=8000):
+    # Runs the server on the current loop, for benchmarks that drive it in-process
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--think-ms", type=int, default=800)
+    parser.add_argument("--answer-seconds", type=float, default=3.0)
+    parser.add_argument("--uplink-kbps", type=int, default=0)
+    parser.add_argument("--downlink-kbps", type=int, default=0)
+    parser.add_argument("--codecs", default="opus,pcm", help="codecs the server will answer in")
+    parser.add_argument("--answer-pcm", help="raw 24 kHz mono int16 file to answer with")
+    args = parser.parse_args()
+
+    server = ReferenceServer(think_ms=args.think_ms, answer_seconds=args.answer_seconds, uplink_kbps=args.uplink_kbps,
+                             downlink_kbps=args.downlink_kbps, codecs=args.codecs.split(','), answer_pcm=args.answer_pcm)
+    web.run_app(server.app(), host=args.host, port=args.port)
@@ -0,0 +1,136 @@
+'''
+File: response_cache.py
+Created Date: Wednesday, October 21st 2026, 10:04:17 am
+
+Project Ver 2024
+'''
+
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from image_pipeline import hamming
+
+
+class CachedAnswer:
+    def __init__(self, phash, mode, prompt, samples, samplerate):
+        self.phash = phash
+        self.mode = mode
+        self.prompt = prompt
+        self.samples = samples      # int16, None while spilled to disk
+        self.samplerate = samplerate
+        self.nbytes = samples.nbytes
+        self.created = time.monotonic()
+        self.path = None
+
+
+class ResponseCache:
+    # Decoded answer audio kept by (perceptual hash of the uploaded frame, mode, prompt), so pressing
+    # describe again at the same scene replays locally. A frame matches an entry within max_distance
+    # bits of its hash and ttl seconds of it being stored. Least recently used entries spill from
+    # memory to disk past memory_bytes and are dropped past max_entries or disk_bytes.
+    def __init__(self, max_entries=64, memory_bytes=16_000_000, disk_bytes=100_000_000, directory='response_cache',
+                 ttl=600, max_distance=6):
+        self.max_entries = max_entries
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = directory
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = OrderedDict()    # id -> CachedAnswer, least recently used first
+        self.next_id = 0
+        self.in_memory = 0
+        self.on_disk = 0
+        self.counts = {"hits": 0, "misses": 0, "stored": 0, "expired": 0, "evicted": 0, "spilled": 0,
+                       "disk_reads": 0}
+
+        # Spilled files are only meaningful to the process that wrote them
+        os.makedirs(directory, exist_ok=True)
+        for name in os.listdir(directory):
+            if name.endswith('.pcm'):
+                os.remove(os.path.join(directory, name))
+
+    def lookup(self, phash, mode, prompt, samplerate):
+        # Int16 samples of the closest live entry for this frame and prompt, recorded at samplerate
+        # (anything else could not be played as is); None on a miss
+        self.expire()
+        best = None
+        for entry_id, entry in self.entries.items():
+            if entry.mode != mode or entry.prompt != prompt or entry.samplerate != samplerate:
+                continue
+            distance = hamming(entry.phash, phash)
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, entry_id)
+        if best is None:
+            self.counts["misses"] += 1
+            return None
+        self.counts["hits"] += 1
+        self.entries.move_to_end(best[1])
+        entry = self.entries[best[1]]
+        if entry.samples is None:
+            self.counts["disk_reads"] += 1
+            return np.fromfile(entry.path, dtype=np.int16)
+        return entry.samples
+
+    def store(self, phash, mode, prompt, samples, samplerate):
+        samples = np.ascontiguousarray(samples, dtype=np.int16)
+        if samples.nbytes > self.memory_bytes:
+            return False
+        # A newer answer for the same scene replaces the old one
+        for entry_id in [i for i, e in self.entries.items()
+                         if e.mode == mode and e.prompt == prompt and hamming(e.phash, phash) <= self.max_distance]:
+            self.remove(entry_id)
+        self.entries[self.next_id] = CachedAnswer(phash, mode, prompt, samples, samplerate)
+        self.next_id += 1
+        self.in_memory += samples.nbytes
+        self.counts["stored"] += 1
+        self.trim()
+        return True
+
+    def expire(self):
+        now = time.monotonic()
+        for entry_id in [i for i, e in self.entries.items() if now - e.created > self.ttl]:
+            self.remove(entry_id)
+            self.counts["expired"] += 1
+
+    def trim(self):
+        # Spill least recently used answers until memory fits, then drop them until the disk does
+        for entry_id, entry in self.entries.items():
+            if self.in_memory <= self.memory_bytes:
+                break
+            if entry.samples is not None:
+                self.spill(entry_id, entry)
+        while self.entries and (len(self.entries) > self.max_entries or self.on_disk > self.disk_bytes):
+            self.remove(next(iter(self.entries)))
+            self.counts["evicted"] += 1
+
+    def spill(self, entry_id, entry):
+        path = os.path.join(self.directory, f'{entry_id}.pcm')
+        try:
+            entry.samples.tofile(path)
+        except OSError as e:
+            print(f"Response cache spill failed: {e}")
+            return
+        entry.path = path
+        entry.samples = None
+        self.in_memory -= entry.nbytes
+        self.on_disk += entry.nbytes
+        self.counts["spilled"] += 1
+
+    def remove(self, entry_id):
+        entry = self.entries.pop(entry_id)
+        if entry.samples is not None:
+            self.in_memory -= entry.nbytes
+            return
+        self.on_disk -= entry.nbytes
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+    def stats(self):
+        lookups = self.counts["hits"] + self.counts["misses"]
+        return dict(self.counts, entries=len(self.entries), memory_kb=self.in_memory // 1000,
+                    disk_kb=self.on_disk // 1000, hit_rate=round(self.counts["hits"] / lookups, 2) if lookups else None)
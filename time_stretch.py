@@ -0,0 +1,131 @@
+'''
+File: time_stretch.py
+Created Date: Thursday, October 22nd 2026, 2:18:36 pm
+
+Project Ver 2024
+'''
+
+import numpy as np
+
+
+class TimeStretcher:
+    # Pitch-preserving playback speed (WSOLA) between the jitter buffer and the output device.
+    # Output is built from Hann-windowed frames overlap-added every frame/2 samples; each frame is taken
+    # speed * frame/2 further along the input, moved by up to search_ms to where it best continues the
+    # previous one (normalised cross-correlation), so pitch periods line up and no phase is smeared.
+    # Runs in the device callback: source(buffer, frames, time, status) fills buffer like an OutputStream
+    # callback does, here the jitter buffer's. speed can be changed at any time, it applies to the next frame.
+    # Added latency is frame + search + frame/2, 53 ms with the defaults.
+    # The search and overlap-add work in buffers allocated here; per hop only the correlation result is new.
+    MIN_SPEED = 0.5
+    MAX_SPEED = 3.0
+
+    def __init__(self, source, samplerate=24000, speed=1.0, frame_ms=30, search_ms=8):
+        self.source = source
+        self.samplerate = samplerate
+        self.frame = samplerate * frame_ms // 1000 // 2 * 2
+        self.hop = self.frame // 2
+        self.search = samplerate * search_ms // 1000
+        self.set_speed(speed)
+        # Periodic Hann: two of them half a frame apart sum to exactly one
+        self.window = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(self.frame) / self.frame)).astype(np.float32)
+        # Input kept from (next frame - search) on; at most one pull of frame + 2 search + a hop at top speed
+        self.max_pull = self.frame + 2 * self.search + int(self.MAX_SPEED * self.hop) + 1
+        self.input = np.zeros(2 * self.max_pull + self.frame, dtype=np.float32)
+        self.pull = np.zeros((self.max_pull, 1), dtype=np.int16)
+        self.overlap = np.zeros(self.frame, dtype=np.float32)
+        self.output = np.zeros(self.hop * 4 + 4096, dtype=np.int16)
+        # Search scratch: the region holds 2 search + 1 candidate frames
+        self.region = self.frame + 2 * self.search
+        self.squares = np.zeros(self.region, dtype=np.float64)
+        self.energy = np.zeros(2 * self.search + 1, dtype=np.float64)
+        self.weighted = np.zeros(self.frame, dtype=np.float32)
+        self.reset()
+
+    @property
+    def latency(self):
+        return (self.frame + self.search + self.hop) / self.samplerate
+
+    def set_speed(self, speed):
+        self.speed = min(max(float(speed), self.MIN_SPEED), self.MAX_SPEED)
+
+    def reset(self):
+        # New stream. The input starts with search samples of silence so the first search has room
+        self.base = -self.search     # stream index of input[0]
+        self.filled = self.search
+        self.input[:self.search] = 0
+        self.position = 0.0          # where the next frame would start at exactly this speed
+        self.last = None             # where the previous frame was actually taken from
+        self.overlap[:] = 0
+        self.ready = 0               # output samples waiting in self.output
+
+    def step(self):
+        # One output hop. Returns how many more input samples are needed first, 0 when it ran.
+        # set_speed() runs on another thread: the speed is read once, so window, search and advance agree
+        speed = self.speed
+        nominal = int(self.position)
+        if self.last is None:
+            start, end = nominal, nominal + self.frame
+        elif speed == 1.0:
+            start, end = self.last + self.hop, self.last + self.hop + self.frame
+        else:
+            start = nominal - self.search
+            end = max(nominal + self.search + self.frame, self.last + self.hop + self.frame)
+        missing = end - (self.base + self.filled)
+        if missing > 0:
+            return missing
+
+        if self.last is None or speed == 1.0:
+            offset = start
+        else:
+            region = self.input[start - self.base:start + self.region - self.base]
+            continuation = self.input[self.last + self.hop - self.base:self.last + self.hop + self.frame - self.base]
+            # np.correlate has no out=, its result (2 search + 1 floats) is the one array made per hop
+            correlation = np.correlate(region, continuation, 'valid')
+            # Candidate energies as differences of the running sum of squares
+            np.square(region, out=self.squares)
+            np.cumsum(self.squares, out=self.squares)
+            self.energy[0] = self.squares[self.frame - 1]
+            np.subtract(self.squares[self.frame:], self.squares[:-self.frame], out=self.energy[1:])
+            self.energy += 1.0
+            np.sqrt(self.energy, out=self.energy)
+            np.divide(correlation, self.energy, out=self.energy)
+            offset = start + int(np.argmax(self.energy))
+
+        frame = self.input[offset - self.base:offset + self.frame - self.base]
+        np.multiply(self.window, frame, out=self.weighted)
+        self.overlap += self.weighted
+        np.rint(self.overlap[:self.hop], out=self.overlap[:self.hop])
+        self.output[self.ready:self.ready + self.hop] = self.overlap[:self.hop]
+        self.ready += self.hop
+        self.overlap[:self.hop] = self.overlap[self.hop:]
+        self.overlap[self.hop:] = 0
+        self.last = offset
+        if speed == 1.0:
+            self.position = offset + self.hop   # plain continuation, nothing searched or skipped
+        else:
+            self.position += speed * self.hop
+
+        # Drop input no later frame can reach
+        keep_from = min(int(self.position) - self.search, self.last + self.hop) - self.base
+        if keep_from > 0:
+            self.input[:self.filled - keep_from] = self.input[keep_from:self.filled]
+            self.filled -= keep_from
+            self.base += keep_from
+        return 0
+
+    def callback(self, outdata, frames, time, status):
+        # sounddevice OutputStream callback, mono
+        if frames + self.hop > len(self.output):
+            self.output = np.concatenate((self.output, np.zeros(frames + self.hop, dtype=np.int16)))
+        while self.ready < frames:
+            missing = self.step()
+            if missing:
+                count = min(missing, self.max_pull)
+                self.source(self.pull[:count], count, time, status)
+                status = None
+                self.input[self.filled:self.filled + count] = self.pull[:count, 0]
+                self.filled += count
+        outdata[:, 0] = self.output[:frames]
+        self.ready -= frames
+        self.output[:self.ready] = self.output[frames:frames + self.ready]